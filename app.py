@@ -1,3 +1,8 @@
+import time
+
+# 起動時間の計測用（スクリプト実行開始時刻）
+_script_started = time.perf_counter()
+
 import streamlit as st
 
 # ページ設定を最初に実行
@@ -8,46 +13,386 @@ st.set_page_config(
 )
 
 # 必要なライブラリをインポート
+import importlib.util
+import logging
 import openai
 import os
+import uuid
 from dotenv import load_dotenv
-import time
-import json
-import re
-
-# 追加ライブラリのインポート（エラーハンドリング付き）
-try:
-    import pandas as pd
-    import plotly.graph_objects as go
-    import plotly.express as px
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
-    st.warning("⚠️ pandas/plotlyが見つかりません。基本機能のみ利用可能です。")
+
+from article_store import get_article_store
+from artifact_store import get_artifact_store
+from export import FORMATS as EXPORT_FORMATS, export_to_tempfile
+from generation import (
+    GENERATION_MODES,
+    TONE_OPTIONS,
+    WORD_COUNT_OPTIONS,
+    build_article_request,
+    TitleStreamParser,
+    build_title_request,
+    parse_title_response,
+    plan_section_rewrite,
+    run_article_job,
+    run_section_rewrite_job,
+    save_article_record,
+    split_article,
+)
+from jobs import CANCELLED, DONE, FAILED, get_job_executor
+from metrics import get_metrics, track
+from openai_client import chat_completion, get_client
+from response_cache import COALESCED, MISS, get_response_cache, get_shared_result_cache, make_cache_key
+from seo import KeywordMatcher, evaluate_article, highlight_keywords
+from similarity import get_duplicate_index
+
+logger = logging.getLogger(__name__)
+
+# plotlyは重いため、ここでは有無だけを確認し、SEO評価タブの表示時に初めて読み込む
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
+if not PLOTLY_AVAILABLE:
+    st.warning("⚠️ plotlyが見つかりません。基本機能のみ利用可能です。")
+
+# SEO評価とグラフは (記事本文, キーワード, タイトル) ごとにキャッシュし、
+# 再実行のたびに再計算・再構築しない（古いものから破棄される）
+@st.cache_data(max_entries=256, show_spinner=False)
+def evaluate_article_cached(article_text, title, seo_keywords, additional_keywords):
+    with track("seo_score", article_length=len(article_text)):
+        return evaluate_article(article_text, title, seo_keywords, additional_keywords)
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def score_gauge_figure(seo_score):
+    from seo_charts import build_score_gauge
+    return build_score_gauge(seo_score)
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def keyword_chart_figure(keyword_counts):
+    from seo_charts import build_keyword_chart
+    return build_keyword_chart(dict(keyword_counts))
+
+
+# 一括SEOレポートは、記事が追加されるまで前回の結果を使う（最新の記事のIDをキーにする）
+@st.cache_data(max_entries=2, show_spinner=False)
+def seo_report_frame(latest_article_id):
+    # pandasは重いため、レポートを表示するときに初めて読み込む
+    from seo_report import REPORT_COLUMNS, evaluate_frame, load_articles_frame
+    with track("seo_report") as span:
+        report = evaluate_frame(load_articles_frame(get_article_store().iter_articles()))
+        span.set(articles=len(report))
+    # キャッシュは取り出すたびに復元されるため、記事本文やキーワードの列は持たせない
+    return report[REPORT_COLUMNS]
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def seo_report_figures(latest_article_id):
+    from seo_charts import build_report_figures
+    return build_report_figures(seo_report_frame(latest_article_id))
+
+
+def session_article():
+    # 記事本文とタイトル候補はディスクに保存し、セッションにはハンドルだけを持たせる
+    return get_artifact_store().get(st.session_state.article_handle, "")
+
+
+def set_session_article(article, article_id=None):
+    # article_id は記事ストアに保存済みの記事を開いた場合のID（類似記事チェックで自分自身を除くため）
+    st.session_state.article_handle = get_artifact_store().put(article) if article else ""
+    st.session_state.article_id = article_id
+
+
+def session_title_options():
+    return get_artifact_store().get(st.session_state.title_options_handle, [])
+
+
+def set_session_title_options(title_options):
+    st.session_state.title_options_handle = get_artifact_store().put(title_options) if title_options else ""
+
+
+def open_stored_article(record):
+    # 保存済みの記事をステップ3まで完了した状態で開く
+    st.session_state.keyword = record["keyword"]
+    st.session_state.selected_title = record["title"]
+    st.session_state.selected_keywords = record["seo_keywords"]
+    st.session_state.additional_keywords = record["additional_keywords"]
+    set_session_article(record["article"], record.get("id"))
+    st.session_state.article_tone = record.get("tone") or record.get("settings", {}).get("tone", "")
+    if not st.session_state.title_options_handle:
+        set_session_title_options([{"title": record["title"], "seo_keywords": record["seo_keywords"]}])
+    st.session_state.step1_completed = True
+    st.session_state.step2_completed = True
+    st.session_state.step3_completed = True
+
+
+def set_keyword(keyword):
+    # 入力例のボタンから呼び出す（ボタンの処理より先に実行されるため、入力欄にすぐ反映される）
+    st.session_state.keyword = keyword
+
+
+def submit_article_job(params, fn=run_article_job):
+    # 記事生成をバックグラウンドのジョブとして登録する（スクリプトの再実行では中断されない）
+    return get_job_executor().submit(
+        st.session_state.session_id, params["title"], fn, get_client(api_key), params
+    )
+
+
+def request_title_options(title_request, cache_key, span, use_cache=True):
+    # タイトル候補を (候補のリスト, 共有キャッシュに入れてよいか) で返す
+    response_cache = get_response_cache()
+    cached_text = response_cache.get(cache_key) if use_cache else None
+    if cached_text is not None:
+        span.set(cache_hit=True)
+        response_text, finish_reason = cached_text, None
+    else:
+        # ストリーミングで受信し、完成した候補から順に表示する
+        stream = chat_completion(
+            get_client(api_key), **title_request, stream=True, stream_options={"include_usage": True}
+        )
+        title_parser = TitleStreamParser()
+        finish_reason = None
+        preview = st.empty()
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    span.record_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                span.first_token()
+                if title_parser.feed(delta):
+                    preview.markdown("\n".join(
+                        f"- 📝 **{option['title']}**" for option in title_parser.titles
+                    ))
+        finally:
+            stream.close()
+        response_text = title_parser.text
+    
+    # 途中で切れた応答でも、完成している候補は使う
+    with track("title_parse"):
+        title_options = parse_title_response(response_text)
+    
+    # 最後まで受信でき、解析に成功した応答のみキャッシュする
+    cacheable = finish_reason != "length"
+    if cached_text is None and cacheable:
+        response_cache.set(cache_key, response_text)
+    return title_options, cacheable
+
+
+def default_article_params(keyword, option):
+    # ステップ3の設定を変更しなかった場合の生成条件
+    return {
+        "keyword": keyword,
+        "title": option['title'],
+        "seo_keywords": option['seo_keywords'],
+        "additional_keywords": [],
+        "word_count": WORD_COUNT_OPTIONS[0],
+        "tone": TONE_OPTIONS[0],
+        "mode": GENERATION_MODES[0],
+    }
+
+
+def same_article_params(a, b):
+    # 生成モードが違っても同じ条件の記事として扱う
+    fields = ("keyword", "title", "seo_keywords", "additional_keywords", "word_count", "tone")
+    return all(list(a[field]) == list(b[field]) if isinstance(a[field], (list, tuple)) else a[field] == b[field] for field in fields)
+
+
+def start_prefetch(keyword, title_options):
+    # 上位のタイトル候補の記事を、トークン予算の範囲で先に生成しておく
+    cancel_prefetch()
+    budget = PREFETCH_TOKEN_BUDGET
+    for option in title_options[:PREFETCH_TITLES]:
+        params = dict(default_article_params(keyword, option), speculative=True)
+        max_tokens = build_article_request(
+            params["title"], keyword, params["seo_keywords"], [], params["word_count"], params["tone"]
+        )["max_tokens"]
+        if max_tokens > budget:
+            break
+        budget -= max_tokens
+        job = submit_article_job(params)
+        st.session_state.prefetch_jobs[job.id] = params
+
+
+def cancel_prefetch(keep_title=None):
+    # 選ばれなかったタイトルの先読み生成を停止する
+    for job_id, params in list(st.session_state.prefetch_jobs.items()):
+        if params["title"] != keep_title:
+            get_job_executor().discard(job_id)
+            del st.session_state.prefetch_jobs[job_id]
+
+
+def find_prefetched_job(params):
+    # 同じ条件で先読み生成したジョブ（停止・失敗したものを除く）を返す
+    for job_id, prefetch_params in st.session_state.prefetch_jobs.items():
+        job = get_job_executor().get(job_id)
+        if job is not None and job.status not in (CANCELLED, FAILED) and same_article_params(params, prefetch_params):
+            return job
+    return None
+
+
+def adopt_prefetched_article(record):
+    # 先読み生成の記事は、ステップ3で使われた時点で保存する
+    # （重複の回避がオンの場合は、その時点の記事履歴と比べ、似ていれば切り口を変えて生成し直す）
+    params = st.session_state.adopted_article_params
+    st.session_state.adopted_article_params = {}
+    duplicates = get_duplicate_index().find(record["article"]) if params.get("avoid_duplicates") else []
+    if not duplicates:
+        save_article_record(record)
+        open_stored_article(record)
+        return
+    # 再生成は1回だけにする
+    job = submit_article_job(dict(
+        params, avoid_duplicates=False, similar_titles=list(dict.fromkeys(match["title"] for match in duplicates))
+    ))
+    st.session_state.article_job_id = job.id
+    st.info(f"🔁 先読み生成した記事が既存の記事「{duplicates[0]['title']}」と似ているため、切り口を変えて再生成しています。")
+
+
+def render_live_seo(evaluation, key):
+    # 生成中の記事のSEO評価（ゲージはスコアごとにキャッシュされる）
+    if PLOTLY_AVAILABLE:
+        st.plotly_chart(score_gauge_figure(evaluation["seo_score"]), use_container_width=True, key=key)
+    else:
+        st.metric("SEO総合スコア", f"{evaluation['seo_score']}/100点")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("🔍 キーワード密度", f"{evaluation['keyword_density']:.1f}%")
+    with col2:
+        st.metric("📑 見出し数", f"H2: {evaluation['h2_count']}, H3: {evaluation['h3_count']}")
+    missing = [keyword for keyword, count in evaluation["keyword_counts"].items() if count == 0]
+    if missing:
+        st.caption(f"まだ使われていないキーワード: {', '.join(missing)}")
+
+
+def render_job_panel(polling):
+    # 先読み生成のジョブは、ステップ3で使われるまで一覧に表示しない
+    jobs = [
+        job for job in get_job_executor().jobs_for(st.session_state.session_id)
+        if job.id not in st.session_state.prefetch_jobs
+    ]
+    
+    for job in reversed(jobs):
+        with st.container(border=True):
+            col1, col2 = st.columns([4, 1])
+            
+            with col1:
+                st.markdown(f"**{job.label}**")
+                if job.status == DONE:
+                    st.success(job.message)
+                elif job.status == FAILED:
+                    st.error(job.message)
+                elif job.status == CANCELLED:
+                    st.warning(job.message)
+                else:
+                    st.progress(job.progress, text=job.message)
+            
+            with col2:
+                if not job.finished:
+                    st.button("⏹ 停止", key=f"job_cancel_{job.id}", disabled=job.cancel_requested, on_click=job.cancel)
+                else:
+                    if job.status == DONE and st.button("📖 開く", key=f"job_open_{job.id}"):
+                        open_stored_article(job.result)
+                        st.rerun()
+                    st.button("🗑 削除", key=f"job_discard_{job.id}", on_click=get_job_executor().discard, args=(job.id,))
+            
+            # 生成中の記事は途中まで表示し、その時点のSEO評価も表示する
+            # （キーワードから外れた内容になっていれば、完成を待たずに停止できる）
+            if not job.finished and job.partial_text:
+                with st.expander("途中までの記事", expanded=job.id == st.session_state.article_job_id):
+                    seo = job.details.get("seo")
+                    if seo:
+                        col1, col2 = st.columns([3, 2])
+                        with col2:
+                            render_live_seo(seo, key=f"live_seo_{job.id}")
+                        with col1:
+                            st.markdown(job.partial_text + "▌")
+                    else:
+                        st.markdown(job.partial_text + "▌")
+    
+    # 表示待ちの記事が完成した場合や、すべてのジョブが終わった場合はページ全体を再実行する
+    # （結果を反映し、定期的な再実行を止める）
+    current_job = get_job_executor().get(st.session_state.article_job_id) if st.session_state.article_job_id else None
+    if polling and ((current_job is not None and current_job.finished) or all(job.finished for job in jobs)):
+        st.rerun()
+
+
+# プロセス単位の起動時間の記録（最初のスクリプト実行をコールドスタートとして扱う）
+@st.cache_resource
+def startup_timings():
+    return {"cold_start_ms": None, "last_run_ms": None}
+
+
+def env_flag(name):
+    # 1 / true / yes / on のときだけオンとみなす（"0" や "false" はオフ）
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# 生成ジョブの一覧を更新する間隔（秒）
+JOB_POLL_INTERVAL = 0.5
+
+EXPORT_FORMAT_LABELS = {"md": "Markdown (.md)", "html": "HTML（SEOメタデータ付き）", "wxr": "WordPress (WXR)"}
 
 # 環境変数の読み込み
 load_dotenv()
 
+# 先読み生成（タイトル候補が表示された時点で、上位の候補の記事を生成しておく）
+# SPECULATIVE_PREFETCH=1 で初期状態をオンにする。トークン数は記事生成の max_tokens で見積もる
+PREFETCH_DEFAULT = env_flag("SPECULATIVE_PREFETCH")
+PREFETCH_TITLES = int(os.getenv("SPECULATIVE_PREFETCH_TITLES", "2"))
+PREFETCH_TOKEN_BUDGET = int(os.getenv("SPECULATIVE_TOKEN_BUDGET", "8000"))
+
 # APIキーの読み込み
 api_key = os.getenv("OPENAI_API_KEY")
 
 # セッション状態の初期化
 if 'keyword' not in st.session_state:
     st.session_state.keyword = ""
-if 'title_options' not in st.session_state:
-    st.session_state.title_options = []
+if 'title_options_handle' not in st.session_state:
+    st.session_state.title_options_handle = ""
 if 'selected_title' not in st.session_state:
     st.session_state.selected_title = ""
 if 'selected_keywords' not in st.session_state:
     st.session_state.selected_keywords = []
-if 'generated_article' not in st.session_state:
-    st.session_state.generated_article = ""
+if 'article_handle' not in st.session_state:
+    st.session_state.article_handle = ""
+if 'article_id' not in st.session_state:
+    st.session_state.article_id = None
 if 'step1_completed' not in st.session_state:
     st.session_state.step1_completed = False
 if 'step2_completed' not in st.session_state:
     st.session_state.step2_completed = False
 if 'step3_completed' not in st.session_state:
     st.session_state.step3_completed = False
+if 'additional_keywords' not in st.session_state:
+    st.session_state.additional_keywords = []
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'article_job_id' not in st.session_state:
+    st.session_state.article_job_id = ""
+if 'prefetch_jobs' not in st.session_state:
+    st.session_state.prefetch_jobs = {}
+if 'article_tone' not in st.session_state:
+    st.session_state.article_tone = ""
+if 'adopted_article_params' not in st.session_state:
+    st.session_state.adopted_article_params = {}
+
+# 生成ジョブが終わっていれば、結果を記事として表示する
+# （停止された場合は途中まで生成された内容を表示する）
+if st.session_state.article_job_id:
+    article_job = get_job_executor().get(st.session_state.article_job_id)
+    if article_job is None or article_job.finished:
+        st.session_state.article_job_id = ""
+    if article_job is not None and article_job.status == DONE:
+        if article_job.details.get("speculative"):
+            adopt_prefetched_article(article_job.result)
+        else:
+            open_stored_article(article_job.result)
+    elif article_job is not None and article_job.status == CANCELLED and article_job.partial_text:
+        set_session_article(article_job.partial_text)
+        st.session_state.step3_completed = True
+        st.warning("⏹ 記事の生成を停止しました。途中まで生成された内容を表示しています。")
 
 # タイトル
 st.title("📝 ステップ式ブログ記事ジェネレーター")
@@ -67,7 +412,8 @@ openai.api_key = api_key
 
 # リセット機能
 if st.button("🔄 リセット", type="secondary"):
-    for key in ['keyword', 'title_options', 'selected_title', 'selected_keywords', 'generated_article', 'step1_completed', 'step2_completed', 'step3_completed']:
+    cancel_prefetch()
+    for key in ['keyword', 'title_options_handle', 'selected_title', 'selected_keywords', 'additional_keywords', 'article_handle', 'article_tone', 'article_job_id', 'step1_completed', 'step2_completed', 'step3_completed']:
         if key in st.session_state:
             if isinstance(st.session_state[key], str):
                 st.session_state[key] = ""
@@ -77,104 +423,169 @@ if st.button("🔄 リセット", type="secondary"):
                 st.session_state[key] = False
     st.rerun()
 
+# ===============================
+# 記事履歴（サイドバー）
+# ===============================
+# 履歴の検索では、この部分だけを再実行する
+@st.fragment
+def article_history():
+    st.header("📚 記事履歴")
+    history_query = st.text_input("🔎 履歴を検索", placeholder="キーワード・タイトル・本文")
+    history = get_article_store().search(history_query, limit=20)
+    
+    if not history:
+        st.caption("保存された記事はありません")
+    
+    for record in history:
+        col1, col2 = st.columns([4, 1])
+        
+        with col1:
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(record["created_at"]))
+            score = f" ・ {record['seo_score']}点" if record["seo_score"] is not None else ""
+            st.markdown(f"**{record['title']}**  \n`{record['keyword']}` ・ {created}{score}")
+        
+        with col2:
+            if st.button("開く", key=f"history_{record['id']}"):
+                open_stored_article(get_article_store().get(record["id"]))
+                st.rerun()
+    
+    if history:
+        with st.expander("📦 まとめてエクスポート"):
+            export_formats = st.multiselect(
+                "出力形式",
+                options=EXPORT_FORMATS,
+                default=list(EXPORT_FORMATS),
+                format_func=lambda fmt: EXPORT_FORMAT_LABELS[fmt],
+                key="export_formats"
+            )
+            # 検索中は検索結果の記事、それ以外は保存済みのすべての記事を出力する
+            if history_query.strip():
+                article_ids = [record["id"] for record in history]
+                target = f"検索結果の{len(article_ids)}件"
+            else:
+                article_ids = None
+                target = "保存済みのすべての記事"
+            
+            def build_export():
+                # ダウンロードボタンを押したときに別スレッドで実行される（記事は1件ずつ読み込んで書き出す）
+                store = get_article_store()
+                records = (store.get(article_id) for article_id in article_ids) if article_ids else store.iter_articles()
+                with export_to_tempfile(records, export_formats) as f:
+                    return f.read()
+            
+            st.download_button(
+                f"⬇️ {target}をZIPでダウンロード",
+                data=build_export,
+                file_name=f"articles_{time.strftime('%Y%m%d_%H%M')}.zip",
+                mime="application/zip",
+                disabled=not export_formats,
+                on_click="ignore",
+                key="export_download"
+            )
+
+
+with st.sidebar:
+    article_history()
+
 st.markdown("---")
 
 # ===============================
 # ステップ1: キーワード入力
 # ===============================
-st.header("🔍 ステップ1: ブログのキーワードを入力")
-
-col1, col2 = st.columns([2, 1])
-
-with col1:
-    keyword_input = st.text_input(
-        "メインキーワード",
-        value=st.session_state.keyword,
-        placeholder="例: プログラミング学習、料理レシピ、読書感想、ダイエット方法",
-        help="ブログで書きたいメインテーマのキーワードを入力してください"
+# キーワードの入力や入力例の選択では、この部分だけを再実行する（タイトル候補を生成するとページ全体を再実行する）
+@st.fragment
+def step1_keyword_input():
+    st.header("🔍 ステップ1: ブログのキーワードを入力")
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        keyword_input = st.text_input(
+            "メインキーワード",
+            value=st.session_state.keyword,
+            placeholder="例: プログラミング学習、料理レシピ、読書感想、ダイエット方法",
+            help="ブログで書きたいメインテーマのキーワードを入力してください"
+        )
+    
+    with col2:
+        st.markdown("#### 📋 入力例")
+        example_keywords = ["プログラミング学習", "簡単料理レシピ", "読書感想", "副業体験談"]
+        
+        for example in example_keywords:
+            st.button(f"📌 {example}", key=f"example_{example}", on_click=set_keyword, args=(example,))
+    
+    # タイトル生成ボタン（再生成はキャッシュを使わずにAPIを呼び出す）
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        generate_titles = st.button("➡️ タイトル候補を生成", type="primary", disabled=not keyword_input)
+    
+    with col2:
+        regenerate_titles = st.button(
+            "🔁 再生成",
+            disabled=not keyword_input,
+            help="キャッシュ済みの候補を使わず、新しいタイトル候補を生成します"
+        )
+    
+    prefetch_enabled = st.toggle(
+        "⚡ 記事を先読み生成",
+        value=PREFETCH_DEFAULT,
+        key="speculative_prefetch",
+        help=f"タイトル候補の上位{PREFETCH_TITLES}件の記事を、選択する前から生成しておきます"
+             f"（最大{PREFETCH_TOKEN_BUDGET:,}トークン）。設定を変更せずに選んだ場合はすぐに記事が表示されます。"
     )
-
-with col2:
-    st.markdown("#### 📋 入力例")
-    example_keywords = ["プログラミング学習", "簡単料理レシピ", "読書感想", "副業体験談"]
     
-    for example in example_keywords:
-        if st.button(f"📌 {example}", key=f"example_{example}"):
-            st.session_state.keyword = example
-            st.rerun()
+    if generate_titles or regenerate_titles:
+        try:
+            with st.spinner("🤖 SEOタイトル候補を生成中..."):
+                title_request = build_title_request(keyword_input)
+                cache_key = make_cache_key(**title_request)
+                
+                with track("title", model=title_request["model"]) as span:
+                    span.set(cache_hit=False)
+                    if regenerate_titles:
+                        title_options, cacheable = request_title_options(title_request, cache_key, span, use_cache=False)
+                        if cacheable:
+                            get_shared_result_cache().set(cache_key, title_options)
+                    else:
+                        # 同じリクエストの結果は全セッション共有のキャッシュから返し、
+                        # 他のセッションが同じリクエストを実行中であれば、その結果を待って使う
+                        title_options, source = get_shared_result_cache().get_or_compute(
+                            cache_key, lambda: request_title_options(title_request, cache_key, span)
+                        )
+                        if source != MISS:
+                            span.set(cache_hit=True, coalesced=source == COALESCED)
+                
+                st.session_state.keyword = keyword_input
+                set_session_title_options(title_options)
+                st.session_state.step1_completed = True
+                
+                if prefetch_enabled:
+                    start_prefetch(keyword_input, title_options)
+                else:
+                    cancel_prefetch()
+                
+                st.success("✅ タイトル候補を生成しました！")
+                st.rerun()
+                
+        except Exception as e:
+            st.error(f"❌ エラーが発生しました: {str(e)}")
 
-# タイトル生成ボタン
-if st.button("➡️ タイトル候補を生成", type="primary", disabled=not keyword_input):
-    try:
-        with st.spinner("🤖 SEOタイトル候補を生成中..."):
-            client = openai.OpenAI(api_key=api_key)
-            
-            title_prompt = f"""
-あなたはSEO専門家です。以下のキーワードに基づいて、SEOに強いブログタイトルを5つ提案してください。
-
-【メインキーワード】
-{keyword_input}
-
-【要求事項】
-1. SEOに効果的なタイトル（検索されやすい）
-2. クリックしたくなる魅力的なタイトル
-3. 30文字以内で収める
-4. 各タイトルに最適なSEOキーワードも提案
-
-【出力形式】
-以下のJSON形式で出力してください：
-{{
-  "titles": [
-    {{
-      "title": "タイトル1",
-      "seo_keywords": ["キーワード1", "キーワード2", "キーワード3"]
-    }},
-    {{
-      "title": "タイトル2", 
-      "seo_keywords": ["キーワード1", "キーワード2", "キーワード3"]
-    }}
-  ]
-}}
-"""
-            
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "あなたはSEO専門家です。JSON形式でのみ回答してください。"},
-                    {"role": "user", "content": title_prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.7
-            )
-            
-            response_text = response.choices[0].message.content
-            
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0]
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1]
-            
-            title_data = json.loads(response_text.strip())
-            
-            st.session_state.keyword = keyword_input
-            st.session_state.title_options = title_data["titles"]
-            st.session_state.step1_completed = True
-            
-            st.success("✅ タイトル候補を生成しました！")
-            st.rerun()
-            
-    except Exception as e:
-        st.error(f"❌ エラーが発生しました: {str(e)}")
+
+step1_keyword_input()
 
 # ===============================
 # ステップ2: タイトル選択（コンパクト表示）
 # ===============================
-if st.session_state.step1_completed and st.session_state.title_options:
+# まとめて生成するタイトルの選択では、この部分だけを再実行する（タイトルを選ぶとページ全体を再実行する）
+@st.fragment
+def step2_title_selection():
     st.markdown("---")
     st.header("📋 ステップ2: ブログタイトルを選択")
     st.markdown(f"**選択したキーワード**: `{st.session_state.keyword}`")
     
     selected_option = None
+    title_options = session_title_options()
     
     # CSS でコンパクトなスタイルを追加
     st.markdown("""
@@ -194,7 +605,7 @@ if st.session_state.step1_completed and st.session_state.title_options:
     </style>
     """, unsafe_allow_html=True)
     
-    for i, option in enumerate(st.session_state.title_options):
+    for i, option in enumerate(title_options):
         col1, col2 = st.columns([5, 1])
         
         with col1:
@@ -205,24 +616,60 @@ if st.session_state.step1_completed and st.session_state.title_options:
                 <span class="compact-keywords">SEOキーワード: {' • '.join([f"`{kw}`" for kw in option['seo_keywords']])}</span>
             </div>
             """, unsafe_allow_html=True)
+            
+            prefetched_job = find_prefetched_job(default_article_params(st.session_state.keyword, option))
+            if prefetched_job is not None:
+                st.caption("⚡ 先読み生成済み（すぐに表示できます）" if prefetched_job.status == DONE else "⚡ 記事を先読み生成中")
         
         with col2:
             st.markdown("<br>", unsafe_allow_html=True)  # ボタンの位置調整
             if st.button(f"✅ 選択", key=f"select_{i}", type="primary"):
                 selected_option = i
     
+    # 複数のタイトルの記事を標準の設定でまとめて生成する（ジョブとして同時に実行される）
+    with st.expander("📥 複数のタイトルの記事をまとめて生成"):
+        queued_titles = st.multiselect(
+            "生成するタイトル",
+            options=range(len(title_options)),
+            format_func=lambda i: title_options[i]['title'],
+            key="queued_titles"
+        )
+        st.caption(f"記事設定は標準（{WORD_COUNT_OPTIONS[1]}文字程度・{TONE_OPTIONS[0]}）で生成します。完成した記事は生成ジョブの一覧から開けます。")
+        
+        if st.button("📥 選択したタイトルの記事を生成", disabled=not queued_titles):
+            for i in queued_titles:
+                option = title_options[i]
+                submit_article_job({
+                    "keyword": st.session_state.keyword,
+                    "title": option['title'],
+                    "seo_keywords": option['seo_keywords'],
+                    "additional_keywords": [],
+                    "word_count": WORD_COUNT_OPTIONS[1],
+                    "tone": TONE_OPTIONS[0],
+                    "mode": GENERATION_MODES[0],
+                })
+            st.rerun()
+    
     if selected_option is not None:
-        st.session_state.selected_title = st.session_state.title_options[selected_option]['title']
-        st.session_state.selected_keywords = st.session_state.title_options[selected_option]['seo_keywords']
+        st.session_state.selected_title = title_options[selected_option]['title']
+        st.session_state.selected_keywords = title_options[selected_option]['seo_keywords']
         st.session_state.step2_completed = True
+        cancel_prefetch(keep_title=st.session_state.selected_title)
         
         st.success(f"✅ 「{st.session_state.selected_title}」を選択しました！")
         st.rerun()
 
+
+if st.session_state.step1_completed and st.session_state.title_options_handle:
+    step2_title_selection()
+
 # ===============================
 # ステップ3: 記事生成（編集可能な選択内容）
 # ===============================
-if st.session_state.step2_completed:
+# 選択内容や設定の編集では、この部分だけを再実行する（記事の生成を始めるとページ全体を再実行する）
+@st.fragment
+def step3_article_settings():
+    article = session_article()
     st.markdown("---")
     st.header("📝 ステップ3: 記事生成")
     
@@ -294,13 +741,27 @@ if st.session_state.step2_completed:
         
         word_count = st.selectbox(
             "📏 記事の長さ",
-            options=[1500, 2500, 3500],
+            options=WORD_COUNT_OPTIONS,
             format_func=lambda x: f"{x}文字程度" + (" (標準)" if x == 2500 else " (短め)" if x == 1500 else " (詳細)")
         )
         
         tone = st.selectbox(
             "🎨 記事のトーン",
-            options=["読みやすい", "専門的", "カジュアル"]
+            options=TONE_OPTIONS
+        )
+        
+        generation_mode = st.radio(
+            "⚡ 生成モード",
+            options=GENERATION_MODES,
+            horizontal=True,
+            help="ストリーミングでは執筆中の記事をリアルタイムで表示し、途中で停止できます。"
+                 "アウトライン並列では構成案を作成した後、各見出しを同時に執筆するため長文でも早く完成します。"
+        )
+        
+        avoid_duplicates = st.toggle(
+            "🧬 既存の記事と似ていたら切り口を変えて再生成",
+            key="avoid_duplicates",
+            help="生成した記事が保存済みの記事とほぼ同じ内容だった場合、重複を避けるよう指示して1回だけ再生成します。"
         )
         
         # 最終的なキーワード一覧の表示
@@ -315,280 +776,176 @@ if st.session_state.step2_completed:
     # 記事生成ボタン（必要な情報がある場合のみ有効）
     can_generate = edited_main_keyword.strip() and edited_title.strip()
     
+    # 同じ条件で生成済みの記事があれば、再生成せずにすぐ開けるようにする
+    existing_article = get_article_store().find_by_params(
+        edited_main_keyword, edited_title, edited_seo_keywords_list, additional_keywords_list, word_count, tone
+    ) if can_generate else None
+    
+    if existing_article:
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(existing_article["created_at"]))
+            st.info(f"💾 同じ条件で生成済みの記事があります（{created}）。再生成せずに開くことができます。")
+        
+        with col2:
+            if st.button("📂 生成済みの記事を開く"):
+                open_stored_article(existing_article)
+                st.rerun()
+    
+    # 表示中の記事からキーワード・トーン・タイトルだけを変えた場合は、影響のある見出しだけを書き直せる
+    previous_keywords = st.session_state.selected_keywords + st.session_state.additional_keywords
+    can_rewrite = (
+        can_generate and not existing_article and article
+        and edited_main_keyword == st.session_state.keyword
+    )
+    rewrite_plan = plan_section_rewrite(
+        article,
+        previous_keywords,
+        edited_seo_keywords_list + additional_keywords_list,
+        tone_changed=tone != st.session_state.article_tone,
+    ) if can_rewrite else {}
+    
+    if rewrite_plan or (can_rewrite and edited_title != st.session_state.selected_title):
+        _, sections, _ = split_article(article)
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            headings = "、".join(f"「{sections[index][0]}」" for index in rewrite_plan) or "なし（タイトルのみ変更）"
+            st.info(f"🧩 表示中の記事の変更が必要な見出し（{len(rewrite_plan)}/{len(sections)}）: {headings}")
+        
+        with col2:
+            if st.button("🧩 変更した見出しだけ再生成"):
+                job = submit_article_job({
+                    "keyword": edited_main_keyword,
+                    "title": edited_title,
+                    "seo_keywords": edited_seo_keywords_list,
+                    "additional_keywords": additional_keywords_list,
+                    "word_count": word_count,
+                    "tone": tone,
+                    "article": article,
+                    "previous_keywords": previous_keywords,
+                    "previous_tone": st.session_state.article_tone,
+                }, fn=run_section_rewrite_job)
+                st.session_state.article_job_id = job.id
+                st.rerun()
+    
     if st.button("🚀 記事を生成する", type="primary", disabled=not can_generate):
         if not can_generate:
             st.error("❌ メインキーワードとタイトルは必須です")
         else:
-            try:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                status_text.text("🤖 記事構成を考えています...")
-                progress_bar.progress(25)
-                
-                client = openai.OpenAI(api_key=api_key)
-                
-                # 編集された内容を使用して記事生成
-                all_keywords = edited_seo_keywords_list + additional_keywords_list
-                
-                article_prompt = f"""
-あなたは優秀なSEOライターです。以下の条件で高品質なブログ記事を作成してください。
-
-【記事情報】
-- タイトル: {edited_title}
-- メインキーワード: {edited_main_keyword}
-- SEOキーワード: {', '.join(edited_seo_keywords_list) if edited_seo_keywords_list else 'なし'}
-- 追加キーワード: {', '.join(additional_keywords_list) if additional_keywords_list else 'なし'}
-- 文字数: 約{word_count}文字
-- トーン: {tone}
-
-【要求事項】
-1. SEOキーワードと追加キーワードを自然に配置
-2. 読者にとって有益で実用的な内容
-3. 見出し構成を明確に
-4. 導入→本文→まとめの構成
-5. 専門性と信頼性を重視
-6. 設定されたキーワードを記事内容に反映させる
-
-【出力形式】
-# {edited_title}
-
-## はじめに
-[読者の興味を引く導入文]
-
-## [見出し2-1]
-[内容1]
-
-## [見出し2-2] 
-[内容2]
-
-## [見出し2-3]
-[内容3]
-
-## まとめ
-[記事のまとめと読者へのメッセージ]
-
----
-【この記事のキーワード】
-- メインキーワード: {edited_main_keyword}
-- SEOキーワード: {', '.join(edited_seo_keywords_list) if edited_seo_keywords_list else 'なし'}
-{f"- 追加キーワード: {', '.join(additional_keywords_list)}" if additional_keywords_list else ""}
-"""
-                
-                progress_bar.progress(50)
-                status_text.text("✍️ 記事を執筆しています...")
-                
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "あなたは優秀なSEOライターです。高品質で検索エンジンに評価される記事を作成してください。"},
-                        {"role": "user", "content": article_prompt}
-                    ],
-                    max_tokens=4000,
-                    temperature=0.7
-                )
-                
-                progress_bar.progress(75)
-                status_text.text("📝 記事を最終調整しています...")
-                
-                generated_article = response.choices[0].message.content
-                st.session_state.generated_article = generated_article
-                st.session_state.step3_completed = True
-                
-                # 編集された内容をセッション状態に反映
-                st.session_state.keyword = edited_main_keyword
-                st.session_state.selected_title = edited_title
-                st.session_state.selected_keywords = edited_seo_keywords_list
-                
-                progress_bar.progress(100)
-                status_text.text("✅ 記事が完成しました！")
-                
-                time.sleep(1)
-                progress_bar.empty()
-                status_text.empty()
-                
-                st.success("🎉 記事の生成が完了しました！")
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ エラーが発生しました: {str(e)}")
+            article_params = {
+                "keyword": edited_main_keyword,
+                "title": edited_title,
+                "seo_keywords": edited_seo_keywords_list,
+                "additional_keywords": additional_keywords_list,
+                "word_count": word_count,
+                "tone": tone,
+                "mode": generation_mode,
+                "avoid_duplicates": avoid_duplicates,
+            }
+            
+            # 同じ条件で先読み生成している場合はそのジョブを使う（完成していればすぐに表示される）
+            job = find_prefetched_job(article_params)
+            if job is not None:
+                del st.session_state.prefetch_jobs[job.id]
+                st.session_state.adopted_article_params = article_params
+            else:
+                # 条件が変わった場合、選択時に残した先読み生成は使われないため止める
+                cancel_prefetch()
+                # 生成はバックグラウンドで行い、完成したら記事を表示する
+                # （生成中も他の操作ができ、別のタイトルの記事を続けて生成することもできる）
+                job = submit_article_job(article_params)
+            st.session_state.article_job_id = job.id
+            st.rerun()
+
+
+if st.session_state.step2_completed:
+    step3_article_settings()
+
+# ===============================
+# 生成ジョブ
+# ===============================
+session_jobs = [
+    job for job in get_job_executor().jobs_for(st.session_state.session_id)
+    if job.id not in st.session_state.prefetch_jobs
+]
+if session_jobs:
+    st.markdown("---")
+    st.header("⏳ 生成ジョブ")
+    
+    # 実行中のジョブがある間だけ、一覧を定期的に更新する（ページ全体は再実行しない）
+    polling = not all(job.finished for job in session_jobs)
+    st.fragment(render_job_panel, run_every=JOB_POLL_INTERVAL if polling else None)(polling)
 
 # ===============================
 # 記事表示と評価
 # ===============================
-if st.session_state.step3_completed and st.session_state.generated_article:
+# 記事プレビューのハイライトやタブの切り替えでは、この部分だけを再実行する
+@st.fragment
+def article_results():
+    article = session_article()
     st.markdown("---")
     st.header("📄 生成された記事")
     
     # 記事をタブで表示
+    # on_change="rerun" で選択中のタブを追跡し、SEO評価タブは開いたときだけ描画する
     if PLOTLY_AVAILABLE:
-        tab1, tab2, tab3 = st.tabs(["📖 記事プレビュー", "📋 記事テキスト", "📊 SEO評価"])
+        tab1, tab2, tab3 = st.tabs(["📖 記事プレビュー", "📋 記事テキスト", "📊 SEO評価"], key="article_tabs", on_change="rerun")
     else:
-        tab1, tab2 = st.tabs(["📖 記事プレビュー", "📋 記事テキスト"])
+        tab1, tab2 = st.tabs(["📖 記事プレビュー", "📋 記事テキスト"], key="article_tabs", on_change="rerun")
+    
+    # SEOキーワードと追加キーワードをまとめて検索するオートマトン（1回の走査で全キーワードを数える）
+    keyword_matcher = KeywordMatcher(st.session_state.selected_keywords + st.session_state.additional_keywords)
     
     with tab1:
-        st.markdown(st.session_state.generated_article)
+        if st.toggle("🔦 キーワードをハイライト", key="highlight_keywords"):
+            st.markdown(highlight_keywords(article, keyword_matcher.find_all(article)))
+        else:
+            st.markdown(article)
     
     with tab2:
         st.text_area(
             "記事テキスト（コピー用）",
-            value=st.session_state.generated_article,
+            value=article,
             height=500,
             help="この内容をコピーしてブログに貼り付けることができます"
         )
     
-    # SEO評価タブ（plotlyが利用可能な場合のみ）
-    if PLOTLY_AVAILABLE:
+    # SEO評価タブ（plotlyが利用可能で、タブが選択されている場合のみ）
+    if PLOTLY_AVAILABLE and tab3.open:
         with tab3:
-            # SEO評価の計算
-            article_text = st.session_state.generated_article
-            article_length = len(article_text)
-            
-            # キーワード出現回数の計算
-            keyword_counts = {}
-            total_keyword_count = 0
-            
-            for keyword in st.session_state.selected_keywords:
-                count = article_text.lower().count(keyword.lower())
-                keyword_counts[keyword] = count
-                total_keyword_count += count
-            
-            # 見出し数の計算
-            h2_count = len(re.findall(r'^## ', article_text, re.MULTILINE))
-            h3_count = len(re.findall(r'^### ', article_text, re.MULTILINE))
-            
-            # タイトル文字数
-            title_length = len(st.session_state.selected_title)
-            
-            # SEOスコアの計算（100点満点）
-            def calculate_seo_score():
-                score = 0
-                
-                # 文字数評価（1500-3000文字が理想）30点
-                if 1500 <= article_length <= 3000:
-                    score += 30
-                elif 1000 <= article_length < 1500 or 3000 < article_length <= 4000:
-                    score += 20
-                else:
-                    score += 10
-                
-                # キーワード密度評価 25点
-                keyword_density = (total_keyword_count / article_length) * 100 if article_length > 0 else 0
-                if 1 <= keyword_density <= 3:
-                    score += 25
-                elif 0.5 <= keyword_density < 1 or 3 < keyword_density <= 5:
-                    score += 15
-                else:
-                    score += 5
-                
-                # 見出し構造評価 20点
-                if h2_count >= 3 and h3_count >= 2:
-                    score += 20
-                elif h2_count >= 2:
-                    score += 15
-                elif h2_count >= 1:
-                    score += 10
-                else:
-                    score += 5
-                
-                # タイトル長評価 15点
-                if 20 <= title_length <= 32:
-                    score += 15
-                elif 15 <= title_length < 20 or 32 < title_length <= 40:
-                    score += 10
-                else:
-                    score += 5
-                
-                # キーワード種類評価 10点
-                if len(st.session_state.selected_keywords) >= 3:
-                    score += 10
-                elif len(st.session_state.selected_keywords) >= 2:
-                    score += 7
-                else:
-                    score += 3
-                
-                return min(score, 100)
-            
-            seo_score = calculate_seo_score()
+            # SEO評価の計算（記事・キーワード・タイトルが同じなら前回の結果を再利用）
+            evaluation = evaluate_article_cached(
+                article,
+                st.session_state.selected_title,
+                tuple(st.session_state.selected_keywords),
+                tuple(st.session_state.additional_keywords)
+            )
+            article_length = evaluation["article_length"]
+            keyword_counts = evaluation["keyword_counts"]
+            keyword_density = evaluation["keyword_density"]
+            h2_count = evaluation["h2_count"]
+            h3_count = evaluation["h3_count"]
+            title_length = evaluation["title_length"]
+            seo_score = evaluation["seo_score"]
             
             # SEO評価グラフ
             col1, col2 = st.columns(2)
             
             with col1:
                 try:
-                    # SEO総合スコア（ゲージチャート）
-                    fig_score = go.Figure(go.Indicator(
-                        mode = "gauge+number+delta",
-                        value = seo_score,
-                        domain = {'x': [0, 1], 'y': [0, 1]},
-                        title = {'text': "SEO総合スコア", 'font': {'size': 20}},
-                        delta = {'reference': 80, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
-                        gauge = {
-                            'axis': {'range': [None, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
-                            'bar': {'color': "darkblue"},
-                            'bgcolor': "white",
-                            'borderwidth': 2,
-                            'bordercolor': "gray",
-                            'steps': [
-                                {'range': [0, 50], 'color': "#ffcccc"},
-                                {'range': [50, 80], 'color': "#ffffcc"},
-                                {'range': [80, 100], 'color': "#ccffcc"}
-                            ],
-                            'threshold': {
-                                'line': {'color': "red", 'width': 4},
-                                'thickness': 0.75,
-                                'value': 90
-                            }
-                        }
-                    ))
-                    fig_score.update_layout(
-                        height=350,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        font={'color': "darkblue", 'family': "Arial"}
-                    )
-                    st.plotly_chart(fig_score, use_container_width=True)
+                    with track("chart_render", chart="score_gauge"):
+                        st.plotly_chart(score_gauge_figure(seo_score), use_container_width=True)
                 except Exception as e:
                     st.error(f"スコアグラフエラー: {str(e)}")
                     st.metric("SEO総合スコア", f"{seo_score}/100点")
             
             with col2:
                 try:
-                    # キーワード出現回数（棒グラフ）
                     if keyword_counts:
-                        keywords = list(keyword_counts.keys())
-                        counts = list(keyword_counts.values())
-                        
-                        fig_keywords = go.Figure(data=[
-                            go.Bar(
-                                x=keywords,
-                                y=counts,
-                                text=counts,
-                                textposition='auto',
-                                marker=dict(
-                                    color=counts,
-                                    colorscale='Blues',
-                                    line=dict(color='rgba(50,50,50,0.5)', width=1)
-                                ),
-                                hovertemplate='<b>%{x}</b><br>出現回数: %{y}回<extra></extra>'
-                            )
-                        ])
-                        
-                        fig_keywords.update_layout(
-                            title={
-                                'text': "SEOキーワード出現回数",
-                                'x': 0.5,
-                                'xanchor': 'center',
-                                'font': {'size': 18}
-                            },
-                            xaxis_title="キーワード",
-                            yaxis_title="出現回数",
-                            height=350,
-                            margin=dict(l=20, r=20, t=60, b=80),
-                            font={'family': "Arial"}
-                        )
-                        
-                        fig_keywords.update_xaxes(tickangle=45)
-                        st.plotly_chart(fig_keywords, use_container_width=True)
+                        with track("chart_render", chart="keyword_bar"):
+                            st.plotly_chart(keyword_chart_figure(tuple(keyword_counts.items())), use_container_width=True)
                     else:
                         st.info("キーワードが検出されませんでした")
                 except Exception as e:
@@ -607,7 +964,6 @@ if st.session_state.step3_completed and st.session_state.generated_article:
                 st.metric("📊 文字数", f"{article_length:,}文字", delta="理想: 1500-3000文字")
             
             with col2:
-                keyword_density = (total_keyword_count / article_length) * 100 if article_length > 0 else 0
                 st.metric("🔍 キーワード密度", f"{keyword_density:.1f}%", delta="理想: 1-3%")
             
             with col3:
@@ -615,13 +971,26 @@ if st.session_state.step3_completed and st.session_state.generated_article:
             
             with col4:
                 st.metric("📝 タイトル文字数", f"{title_length}文字", delta="理想: 20-32文字")
+            
+            # 保存済みの記事との類似チェック（LSHで候補を絞るため、記事が増えても全件とは比較しない）
+            st.markdown("### 🧬 類似記事チェック")
+            # 生成した直後の記事はIDを持たないため、同じ本文で最も新しく保存された記事を自分自身とみなす
+            duplicate_index = get_duplicate_index()
+            displayed_id = st.session_state.article_id or duplicate_index.latest_id(article)
+            duplicates = duplicate_index.find(article, exclude_id=displayed_id)
+            if duplicates:
+                st.warning(f"⚠️ 内容がほぼ同じ記事が{len(duplicates)}件あります。重複コンテンツは検索順位が下がる原因になります。")
+                for match in duplicates:
+                    st.write(f"• **{match['title']}**（`{match['keyword']}`）: 類似度 {match['similarity']:.0%}")
+            else:
+                st.success("✅ 内容がほぼ同じ既存の記事は見つかりませんでした")
     
     # 基本的な記事情報（plotlyがない場合も表示）
     st.markdown("---")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("📊 文字数", f"{len(st.session_state.generated_article):,}文字")
+        st.metric("📊 文字数", f"{len(article):,}文字")
     
     with col2:
         st.metric("🔍 キーワード", st.session_state.keyword)
@@ -630,7 +999,63 @@ if st.session_state.step3_completed and st.session_state.generated_article:
         st.metric("🎯 SEOキーワード数", len(st.session_state.selected_keywords))
     
     with col4:
-        st.metric("⭐ 設定トーン", tone if 'tone' in locals() else "未設定")
+        st.metric("⭐ 設定トーン", st.session_state.article_tone or "未設定")
+
+
+if st.session_state.step3_completed and st.session_state.article_handle:
+    article_results()
+
+# ===============================
+# 一括SEOレポート
+# ===============================
+# 保存済みのすべての記事のSEO評価をまとめて計算する（操作してもこの部分だけを再実行する）
+@st.fragment
+def seo_report_dashboard():
+    latest = get_article_store().recent(1)
+    if not latest:
+        return
+    
+    st.markdown("---")
+    st.header("📈 一括SEOレポート")
+    if not st.toggle("保存済みのすべての記事を評価する", key="show_seo_report"):
+        return
+    
+    with st.spinner("📈 記事を評価しています..."):
+        report = seo_report_frame(latest[0]["id"])
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("📚 記事数", f"{len(report):,}件")
+    col2.metric("⭐ 平均スコア", f"{report['seo_score'].mean():.1f}点")
+    col3.metric("⚠️ 50点未満", f"{(report['seo_score'] < 50).sum():,}件")
+    col4.metric("🔍 密度の外れ値", f"{report['density_outlier'].sum():,}件")
+    
+    labels = ["📋 記事一覧"]
+    if PLOTLY_AVAILABLE:
+        labels = ["📊 スコア分布", "🔍 密度の外れ値", "🏷 キーワード別"] + labels
+    tabs = st.tabs(labels, key="report_tabs", on_change="rerun")
+    
+    if PLOTLY_AVAILABLE:
+        figures = seo_report_figures(latest[0]["id"])
+        for tab, figure, chart in zip(tabs, figures, ["score_distribution", "density_outliers", "score_by_keyword"]):
+            if tab.open:
+                with tab, track("chart_render", chart=chart):
+                    st.plotly_chart(figure, use_container_width=True, key=f"report_{chart}")
+    
+    if tabs[-1].open:
+        with tabs[-1]:
+            columns = {
+                "title": "タイトル", "keyword": "キーワード", "seo_score": "SEOスコア", "article_length": "文字数",
+                "keyword_density": "キーワード密度（%）", "h2_count": "H2", "h3_count": "H3",
+                "title_length": "タイトル文字数", "density_outlier": "密度の外れ値", "created_at": "作成日時",
+            }
+            st.dataframe(
+                report[list(columns)].rename(columns=columns).sort_values("SEOスコア"),
+                hide_index=True,
+                column_config={"キーワード密度（%）": st.column_config.NumberColumn(format="%.2f")}
+            )
+
+
+seo_report_dashboard()
 
 # フッター
 st.markdown("---")
@@ -644,3 +1069,45 @@ st.markdown("""
 ### ⚠️ 注意事項
 生成された記事は参考として使用し、必要に応じて編集してください
 """)
+
+# 管理パネル（ADMIN_PANEL=1 のときのみ表示）
+if env_flag("ADMIN_PANEL"):
+    with st.sidebar.expander("🛠 管理パネル", expanded=False):
+        metrics_summary = get_metrics().summary()
+        if metrics_summary:
+            st.markdown("**ステップ別の処理時間**")
+            st.dataframe(metrics_summary, hide_index=True)
+        else:
+            st.info("まだ計測データがありません")
+        st.markdown("**共有キャッシュ（全セッション）**")
+        shared_stats = get_shared_result_cache().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("ヒット", shared_stats["hits"])
+        col2.metric("集約", shared_stats["coalesced"], help="実行中の同じリクエストの結果を待って使った回数")
+        col3.metric("ミス", shared_stats["misses"])
+        col4.metric("件数", shared_stats["entries"])
+        st.markdown("**セッションデータのメモリ使用量（全セッション）**")
+        artifact_stats = get_artifact_store().stats()
+        st.progress(
+            min(artifact_stats["memory_bytes"] / artifact_stats["memory_budget_bytes"], 1.0),
+            text=f"{artifact_stats['memory_bytes'] / 1024 / 1024:.1f} / {artifact_stats['memory_budget_bytes'] / 1024 / 1024:.0f} MB"
+                 f"（{artifact_stats['memory_entries']}件）"
+        )
+        col1, col2, col3 = st.columns(3)
+        col1.metric("ディスク", f"{artifact_stats['disk_bytes'] / 1024 / 1024:.1f} MB", help=f"{artifact_stats['disk_files']}ファイル")
+        col2.metric("再読み込み", artifact_stats["loads"], help="メモリから追い出された後、ディスクから読み直した回数")
+        col3.metric("追い出し", artifact_stats["evictions"])
+        st.markdown("**Prometheus形式のスナップショット**")
+        st.code(get_metrics().prometheus_text(), language="text")
+
+# 起動時間の記録
+script_run_ms = (time.perf_counter() - _script_started) * 1000
+timings = startup_timings()
+timings["last_run_ms"] = script_run_ms
+cold_start = timings["cold_start_ms"] is None
+if cold_start:
+    timings["cold_start_ms"] = script_run_ms
+    logger.info("コールドスタート: 初回のスクリプト実行に %.0fms", script_run_ms)
+get_metrics().record("script_run", script_run_ms, cold_start=cold_start)
+if env_flag("SHOW_STARTUP_TIME"):
+    st.caption(f"⏱ 初回実行: {timings['cold_start_ms']:.0f}ms / 今回の実行: {script_run_ms:.0f}ms")
@@ -0,0 +1,253 @@
+"""生成した記事の保存と検索（SQLite + FTS5）
+
+キーワード・タイトル・SEOキーワード・設定・本文・SEOスコア・トークン使用量を保存する。
+書き込みはバックグラウンドのスレッドでまとめて行い、呼び出し側（UIスレッド）を待たせない。
+全文検索は日本語でも部分一致できるよう trigram トークナイザーを使う
+（3文字未満の検索語、またはFTS5が使えない環境では LIKE 検索に切り替える）。
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import track
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "articles.sqlite3")
+
+# まとめて書き込む最大件数と、最初の1件を受け取ってから待つ最大秒数
+WRITE_BATCH_SIZE = 50
+WRITE_BATCH_WAIT = 0.5
+
+_COLUMNS = [
+    "params_hash", "keyword", "title", "seo_keywords", "additional_keywords", "settings",
+    "article", "seo_score", "prompt_tokens", "completion_tokens", "created_at",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def make_params_hash(keyword, title, seo_keywords, additional_keywords, word_count, tone):
+    """生成条件が同じ記事を見つけるためのハッシュ"""
+    payload = json.dumps(
+        [keyword, title, list(seo_keywords), list(additional_keywords), word_count, tone],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArticleStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 読み込み用の接続（WALモードのため書き込み中でも読める）
+        self._read_lock = threading.Lock()
+        self._read_conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._read_conn.row_factory = sqlite3.Row
+        self.fts_enabled = self._create_schema(self._read_conn)
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="article-store-writer", daemon=True)
+        self._writer.start()
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    params_hash TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    seo_keywords TEXT NOT NULL,
+                    additional_keywords TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    article TEXT NOT NULL,
+                    seo_score INTEGER,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_params_hash ON articles (params_hash, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles (created_at)")
+            try:
+                conn.execute(
+                    """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                        keyword, title, seo_keywords, article,
+                        content='articles', content_rowid='id', tokenize='trigram'
+                    )
+                    """
+                )
+            except sqlite3.OperationalError:
+                # FTS5（またはtrigram）に対応していないSQLite
+                return False
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                    INSERT INTO articles_fts (rowid, keyword, title, seo_keywords, article)
+                    VALUES (new.id, new.keyword, new.title, new.seo_keywords, new.article);
+                END
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, keyword, title, seo_keywords, article)
+                    VALUES ('delete', old.id, old.keyword, old.title, old.seo_keywords, old.article);
+                END
+                """
+            )
+        return True
+
+    # ===============================
+    # 書き込み（バックグラウンド）
+    # ===============================
+
+    def save(self, keyword, title, seo_keywords, additional_keywords, word_count, tone, article,
+             seo_score=None, prompt_tokens=None, completion_tokens=None, **settings):
+        """記事を保存キューに追加する（書き込みの完了は待たない）"""
+        settings.update(word_count=word_count, tone=tone)
+        self._queue.put((
+            make_params_hash(keyword, title, seo_keywords, additional_keywords, word_count, tone),
+            keyword,
+            title,
+            json.dumps(list(seo_keywords), ensure_ascii=False),
+            json.dumps(list(additional_keywords), ensure_ascii=False),
+            json.dumps(settings, ensure_ascii=False),
+            article,
+            seo_score,
+            prompt_tokens,
+            completion_tokens,
+            time.time(),
+        ))
+
+    def flush(self, timeout=None):
+        """キューに溜まった書き込みが完了するまで待つ"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        insert = f"INSERT INTO articles ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_BATCH_WAIT
+            while len(batch) < WRITE_BATCH_SIZE and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                try:
+                    # 失敗したバッチは計測結果にエラーとして記録される
+                    with track("article_store_write", rows=len(rows)), conn:
+                        conn.executemany(insert, rows)
+                except sqlite3.Error:
+                    # 書き込みに失敗しても生成処理には影響させない
+                    logger.exception("記事の保存に失敗しました（%d件）: %s", len(rows), self.path)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    # ===============================
+    # 読み込み
+    # ===============================
+
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return [_row_to_dict(row) for row in self._read_conn.execute(sql, params).fetchall()]
+
+    def get(self, article_id):
+        rows = self._query("SELECT * FROM articles WHERE id = ?", (article_id,))
+        return rows[0] if rows else None
+
+    def find_by_params(self, keyword, title, seo_keywords, additional_keywords, word_count, tone):
+        """同じ条件で生成された最新の記事を返す（なければ None）"""
+        params_hash = make_params_hash(keyword, title, seo_keywords, additional_keywords, word_count, tone)
+        rows = self._query(
+            "SELECT * FROM articles WHERE params_hash = ? ORDER BY created_at DESC LIMIT 1", (params_hash,)
+        )
+        return rows[0] if rows else None
+
+    def recent(self, limit=20):
+        return self._query(
+            "SELECT id, keyword, title, seo_score, created_at FROM articles ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        )
+
+    def search(self, text, limit=20):
+        """キーワード・タイトル・SEOキーワード・本文を全文検索する（新しい順）"""
+        text = text.strip()
+        if not text:
+            return self.recent(limit)
+
+        if self.fts_enabled and len(text) >= 3:
+            # 入力はフレーズとして扱う（FTS5の構文として解釈させない）
+            phrase = '"' + text.replace('"', '""') + '"'
+            return self._query(
+                """
+                SELECT a.id, a.keyword, a.title, a.seo_score, a.created_at
+                FROM articles_fts JOIN articles AS a ON a.id = articles_fts.rowid
+                WHERE articles_fts MATCH ?
+                ORDER BY a.created_at DESC LIMIT ?
+                """,
+                (phrase, limit),
+            )
+
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._query(
+            """
+            SELECT id, keyword, title, seo_score, created_at FROM articles
+            WHERE keyword LIKE ?1 ESCAPE '\\' OR title LIKE ?1 ESCAPE '\\'
+               OR seo_keywords LIKE ?1 ESCAPE '\\' OR article LIKE ?1 ESCAPE '\\'
+            ORDER BY created_at DESC LIMIT ?2
+            """,
+            (pattern, limit),
+        )
+
+    def iter_articles(self, batch_size=200, after_id=0):
+        """保存済みの記事をすべて（古い順に）少しずつ読み込んで返す（after_id より後の記事のみ）"""
+        last_id = after_id
+        while True:
+            rows = self._query("SELECT * FROM articles WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]["id"]
+
+
+def _row_to_dict(row):
+    record = dict(row)
+    for key in ("seo_keywords", "additional_keywords", "settings"):
+        if key in record:
+            record[key] = json.loads(record[key])
+    return record
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_article_store():
+    """プロセス共有の記事ストアを返す（保存先は環境変数 ARTICLE_STORE_PATH で変更できる）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArticleStore(os.getenv("ARTICLE_STORE_PATH", DEFAULT_STORE_PATH))
+    return _store
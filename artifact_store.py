@@ -0,0 +1,164 @@
+"""セッションの大きなデータ（記事本文・タイトル候補）の保存先
+
+st.session_state に記事本文などをそのまま持たせると、開いたままのタブが多いサーバーではメモリが増え続ける。
+ここでは値を内容のハッシュをキーにディスクへ保存し、セッションにはハッシュ（ハンドル）だけを持たせる。
+読み込んだ値はプロセス全体で上限（環境変数 SESSION_MEMORY_BUDGET_MB）付きのメモリキャッシュに置き、
+上限を超えたら最後に使われてから最も時間がたった値（操作されていないセッションのもの）から捨てる。
+捨てた値も、次に使うときにディスクから読み直される。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_ARTIFACT_DIR = os.path.join(".cache", "session_artifacts")
+DEFAULT_MEMORY_BUDGET_MB = 64
+# この時間使われていないファイルは、ディスクからも削除する
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+PRUNE_INTERVAL = 100
+# メモリから読んだ値のファイルの更新日時を、この間隔より頻繁には更新しない
+TOUCH_INTERVAL = 24 * 60 * 60
+
+
+class ArtifactStore:
+    def __init__(self, directory=DEFAULT_ARTIFACT_DIR, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # ハンドル → (値, バイト数, ファイルの更新日時を最後に更新した時刻)。最後に使われた順に並べる
+        self._memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._puts = 0
+
+    def _path(self, handle):
+        return os.path.join(self.directory, handle[:2], handle + ".json")
+
+    def put(self, value):
+        """value（JSONにできる値）を保存してハンドルを返す（同じ内容の値は1つだけ保存される）"""
+        data = json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        handle = hashlib.sha256(data).hexdigest()
+        path = self._path(handle)
+        if os.path.exists(path):
+            self._touch(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        with self._lock:
+            self._remember(handle, value, len(data))
+            self._puts += 1
+            prune = self._puts % PRUNE_INTERVAL == 0
+        if prune:
+            self.prune()
+        return handle
+
+    def get(self, handle, default=None):
+        """ハンドルの値を返す（ディスクからも消えている場合は default）"""
+        if not handle:
+            return default
+        path = self._path(handle)
+        with self._lock:
+            entry = self._memory.get(handle)
+            if entry is not None:
+                self._memory.move_to_end(handle)
+                self.hits += 1
+                value, size, touched_at = entry
+                now = time.time()
+                if now - touched_at < TOUCH_INTERVAL:
+                    return value
+                self._memory[handle] = (value, size, now)
+        if entry is not None:
+            self._touch(path)
+            return value
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return default
+        value = json.loads(data)
+        self._touch(path)
+        with self._lock:
+            self.loads += 1
+            self._remember(handle, value, len(data))
+        return value
+
+    def _touch(self, path):
+        # 使われているファイルは期限切れで削除されないようにする
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, handle, value, size):
+        if handle in self._memory:
+            self._memory.move_to_end(handle)
+            return
+        self._memory[handle] = (value, size, time.time())
+        self.memory_bytes += size
+        while self.memory_bytes > self.memory_budget_bytes and len(self._memory) > 1:
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self.memory_bytes -= evicted_size
+            self.evictions += 1
+
+    def prune(self):
+        """一定期間使われていないファイルをディスクから削除する"""
+        expires = time.time() - self.ttl_seconds
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < expires:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        disk_files = disk_bytes = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    disk_bytes += os.path.getsize(os.path.join(root, name))
+                    disk_files += 1
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "disk_files": disk_files,
+                "disk_bytes": disk_bytes,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """プロセス共有の保存先を返す（保存先は環境変数 SESSION_ARTIFACT_DIR で変更できる）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore(
+                directory=os.getenv("SESSION_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR),
+                memory_budget_bytes=int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB)) * 1024 * 1024),
+                ttl_seconds=float(os.getenv("SESSION_ARTIFACT_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            )
+    return _store
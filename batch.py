@@ -0,0 +1,246 @@
+"""キーワード一覧からタイトルと記事をまとめて生成するバッチ処理
+
+使い方:
+    python batch.py keywords.csv -o articles.jsonl --concurrency 8
+
+入力はCSV（ヘッダー付き）またはJSONL。各行の項目:
+    keyword             メインキーワード（必須）
+    word_count          記事の文字数（省略時 2500）
+    tone                記事のトーン（省略時 読みやすい）
+    additional_keywords 追加キーワード（JSONLはリスト、CSVは「|」または改行区切り）
+値が不正な行は行番号を表示して飛ばし、残りの行は続けて処理する。
+
+結果は完了した順にJSONLへ1行ずつ書き出すため、件数が多くてもメモリ使用量は一定に保たれる。
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from article_store import get_article_store
+from generation import add_token_usage, build_article_request, build_title_request, parse_title_response
+from metrics import get_metrics, track
+from openai_client import async_chat_completion, create_async_client
+from response_cache import get_response_cache, make_cache_key
+from seo import evaluate_article
+
+DEFAULT_WORD_COUNT = 2500
+DEFAULT_TONE = "読みやすい"
+
+
+def _split_keywords(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(kw).strip() for kw in value if str(kw).strip()]
+    return [kw.strip() for kw in re.split(r"[|\n]", str(value)) if kw.strip()]
+
+
+def _parse_job(row):
+    """入力の1行を生成条件の辞書にする（キーワードのない行は None、値が不正な行は ValueError）"""
+    if not isinstance(row, dict):
+        raise ValueError("オブジェクトではありません")
+    keyword = str(row.get("keyword") or "").strip()
+    if not keyword:
+        return None
+    word_count = row.get("word_count") or DEFAULT_WORD_COUNT
+    try:
+        word_count = int(word_count)
+    except (TypeError, ValueError):
+        raise ValueError(f"word_count が整数ではありません: {word_count!r}") from None
+    if word_count <= 0:
+        raise ValueError(f"word_count は1以上にしてください: {word_count}")
+    return {
+        "keyword": keyword,
+        "word_count": word_count,
+        "tone": str(row.get("tone") or DEFAULT_TONE).strip(),
+        "additional_keywords": _split_keywords(row.get("additional_keywords")),
+    }
+
+
+def read_jobs(path):
+    """入力ファイルを1行ずつ読み込み、生成条件の辞書を順に返す
+
+    不正な行は行番号とともに標準エラー出力に表示して飛ばし、残りの行は続けて読み込む。
+    """
+    is_jsonl = path.endswith(".jsonl")
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if is_jsonl:
+            rows = ((line_number, line) for line_number, line in enumerate(f, start=1) if line.strip())
+        else:
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num, row) for row in reader)
+
+        for line_number, row in rows:
+            try:
+                job = _parse_job(json.loads(row) if is_jsonl else row)
+            except ValueError as e:
+                print(f"⚠️ {path}:{line_number}行目を飛ばしました: {e}", file=sys.stderr)
+                continue
+            if job is not None:
+                yield job
+
+
+async def generate_titles(client, keyword, use_cache=True, token_usage=None):
+    title_request = build_title_request(keyword)
+
+    response_cache = get_response_cache()
+    cache_key = make_cache_key(**title_request)
+
+    with track("title", model=title_request["model"], batch=True) as span:
+        cached_text = response_cache.get(cache_key) if use_cache else None
+        span.set(cache_hit=cached_text is not None)
+        if cached_text is not None:
+            return parse_title_response(cached_text)
+
+        response = await async_chat_completion(client, **title_request)
+        span.record_usage(response.usage)
+    if token_usage is not None:
+        add_token_usage(token_usage, response.usage)
+
+    response_text = response.choices[0].message.content
+    with track("title_parse", batch=True):
+        title_options = parse_title_response(response_text)
+    response_cache.set(cache_key, response_text)
+    return title_options
+
+
+async def generate_article(client, job, title, seo_keywords, token_usage=None):
+    article_request = build_article_request(
+        title=title,
+        main_keyword=job["keyword"],
+        seo_keywords=seo_keywords,
+        additional_keywords=job["additional_keywords"],
+        word_count=job["word_count"],
+        tone=job["tone"]
+    )
+    with track("article", model=article_request["model"], batch=True) as span:
+        response = await async_chat_completion(client, **article_request)
+        span.record_usage(response.usage)
+    if token_usage is not None:
+        add_token_usage(token_usage, response.usage)
+    return response.choices[0].message.content
+
+
+async def process_job(client, semaphore, job, title_index=0, use_cache=True, store=None):
+    result = dict(job)
+    started = time.perf_counter()
+    # タイトル生成（キャッシュにない場合）と記事生成のトークン使用量の合計
+    token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    try:
+        # タイトル生成と記事生成はそれぞれ同時実行数の枠を取得してから呼び出す
+        async with semaphore:
+            title_options = await generate_titles(client, job["keyword"], use_cache=use_cache, token_usage=token_usage)
+        selected = title_options[min(title_index, len(title_options) - 1)]
+
+        async with semaphore:
+            article = await generate_article(client, job, selected["title"], selected["seo_keywords"], token_usage)
+
+        result.update(
+            title=selected["title"],
+            seo_keywords=selected["seo_keywords"],
+            title_options=title_options,
+            article=article,
+            **token_usage,
+        )
+
+        if store is not None:
+            evaluation = evaluate_article(article, selected["title"], selected["seo_keywords"], job["additional_keywords"])
+            store.save(
+                keyword=job["keyword"],
+                title=selected["title"],
+                seo_keywords=selected["seo_keywords"],
+                additional_keywords=job["additional_keywords"],
+                word_count=job["word_count"],
+                tone=job["tone"],
+                article=article,
+                seo_score=evaluation["seo_score"],
+                generation_mode="バッチ",
+                **token_usage,
+            )
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def run_batch(jobs, output_path, concurrency=4, title_index=0, use_cache=True, use_store=True):
+    client = create_async_client()
+    store = get_article_store() if use_store else None
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = set()
+    succeeded = failed = 0
+
+    def write_results(done, out):
+        nonlocal succeeded, failed
+        for task in done:
+            result = task.result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if "error" in result:
+                failed += 1
+                print(f"❌ {result['keyword']}: {result['error']}", file=sys.stderr)
+            else:
+                succeeded += 1
+                print(f"✅ {result['keyword']}: {result['title']}", file=sys.stderr)
+        out.flush()
+
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for job in jobs:
+                # 実行待ちのタスク数を制限し、入力を先読みしすぎないようにする
+                if len(pending) >= concurrency * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    write_results(done, out)
+                pending.add(asyncio.create_task(
+                    process_job(client, semaphore, job, title_index=title_index, use_cache=use_cache, store=store)
+                ))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                write_results(done, out)
+    finally:
+        await client.close()
+        if store is not None:
+            store.flush()
+        # 一定間隔を待たずに、最後の計測結果までスナップショットに書き出す
+        get_metrics().flush()
+
+    return succeeded, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="キーワード一覧からブログ記事をまとめて生成します")
+    parser.add_argument("input", help="キーワードを含むCSVまたはJSONLファイル")
+    parser.add_argument("-o", "--output", default="articles.jsonl", help="結果を書き出すJSONLファイル")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="APIの同時リクエスト数")
+    parser.add_argument("--title-index", type=int, default=0, help="記事に使うタイトル候補の番号（0始まり）")
+    parser.add_argument("--no-cache", action="store_true", help="タイトル生成のキャッシュを使わない")
+    parser.add_argument("--no-store", action="store_true", help="生成した記事を記事履歴に保存しない")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        parser.error(".envファイルまたは環境変数にOPENAI_API_KEYを設定してください")
+
+    started = time.perf_counter()
+    succeeded, failed = asyncio.run(run_batch(
+        read_jobs(args.input),
+        args.output,
+        concurrency=args.concurrency,
+        title_index=args.title_index,
+        use_cache=not args.no_cache,
+        use_store=not args.no_store,
+    ))
+    elapsed = time.perf_counter() - started
+    print(f"🎉 完了: 成功 {succeeded}件 / 失敗 {failed}件（{elapsed:.1f}秒） → {args.output}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""ベンチマーク用のOpenAI互換モックサーバー
+
+POST /v1/chat/completions だけを実装し、応答までの待ち時間・トークンの送信速度・
+エラーの発生率を指定できる。ストリーミング（SSE）とトークン使用量にも対応する。
+応答の内容はプロンプトから判断する（タイトル候補・アウトラインはJSON、記事はMarkdown）。
+OpenAIのプロンプトキャッシュと同じく、以前のリクエストと共通する先頭部分
+（1024トークン以上、128トークン単位）を usage.prompt_tokens_details.cached_tokens として返す。
+
+単体で起動する場合:
+    python -m bench.mock_openai_server --port 8765 --latency 0.3 --tokens-per-second 300
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1トークンあたりの文字数（日本語のおおよその目安）
+CHARS_PER_TOKEN = 1
+
+# プロンプトキャッシュが効く最小のトークン数と、キャッシュされる単位
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+
+class PromptPrefixCache:
+    """プロンプトの先頭部分を記録し、以前のリクエストと共通する長さを返す"""
+
+    def __init__(self, min_tokens=PROMPT_CACHE_MIN_TOKENS, increment=PROMPT_CACHE_INCREMENT):
+        self.min_tokens = min_tokens
+        self.increment = increment
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt_text):
+        """キャッシュ済みのトークン数を返し、このプロンプトの先頭部分を記録する"""
+        total_tokens = len(prompt_text) // CHARS_PER_TOKEN
+        cached_tokens = 0
+        with self._lock:
+            for tokens in range(self.min_tokens, total_tokens + 1, self.increment):
+                prefix = prompt_text[:tokens * CHARS_PER_TOKEN]
+                if prefix in self._prefixes:
+                    cached_tokens = tokens
+                else:
+                    self._prefixes.add(prefix)
+        return cached_tokens
+
+
+def _user_prompt(messages):
+    return next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+
+def _prompt_field(prompt, name, default=""):
+    match = re.search(rf"{name}: (.+)", prompt)
+    return match.group(1).strip() if match else default
+
+
+def build_completion_text(messages, response_format=None):
+    """リクエストの内容に応じた、それらしい応答本文を返す
+
+    response_format が指定された場合（JSONモード・Structured Outputs）、JSONをコードブロックで囲まない。
+    """
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    prompt = _user_prompt(messages)
+
+    if "JSON" in system and "アウトライン" in system:
+        return json.dumps({
+            "introduction": ["読者の悩み", "この記事でわかること"],
+            "sections": [
+                {"heading": f"基本のポイント{i}", "points": ["要点A", "要点B"], "keywords": []}
+                for i in range(1, 4)
+            ],
+            "summary": ["要点の振り返り", "次の一歩"],
+        }, ensure_ascii=False)
+
+    if "JSON" in system:
+        keyword = prompt.split("【メインキーワード】")[-1].strip().splitlines()[0] if "【メインキーワード】" in prompt else "キーワード"
+        titles = json.dumps({
+            "titles": [
+                {"title": f"{keyword}の始め方：初心者向け完全ガイド{i}", "seo_keywords": [keyword, "初心者", "始め方"]}
+                for i in range(1, 6)
+            ]
+        }, ensure_ascii=False)
+        return titles if response_format else "```json\n" + titles + "\n```"
+
+    # 記事（全体または1セクション）
+    target = re.search(r"約(\d+)文字", prompt)
+    target_chars = int(target.group(1)) if target else 1000
+    keyword = _prompt_field(prompt, "メインキーワード", "キーワード")
+    title = _prompt_field(prompt, "タイトル", f"{keyword}ガイド")
+    sentence = f"{keyword}について、初心者にもわかりやすく具体的な手順と注意点を解説します。"
+
+    if "【執筆する見出し】" in prompt:
+        lines = []
+    else:
+        lines = [f"# {title}", "", "## はじめに"]
+    section = 0
+    while sum(len(line) for line in lines) < target_chars:
+        if len(lines) % 12 == 3:
+            section += 1
+            lines += ["", f"## ポイント{section}", f"### 具体例{section}"]
+        lines.append(sentence)
+    if "【執筆する見出し】" not in prompt:
+        lines += ["", "## まとめ", sentence]
+    return "\n".join(lines)
+
+
+def _tokens(text):
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+
+        # エラーの注入（429はRetry-After付き、それ以外は500）
+        if config["error_rate"] and self.server.random.random() < config["error_rate"]:
+            with self.server.stats_lock:
+                self.server.stats["errors"] += 1
+            if self.server.random.random() < 0.5:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                                headers={"retry-after-ms": str(int(config["retry_after"] * 1000))})
+            else:
+                self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        messages = request.get("messages") or []
+        model = request.get("model", "mock-model")
+        text_tokens = _tokens(build_completion_text(messages, request.get("response_format")))
+        tokens = text_tokens[:request.get("max_tokens") or None]
+        finish_reason = "length" if len(tokens) < len(text_tokens) else "stop"
+        prompt_text = "".join(m.get("content") or "" for m in messages)
+        cached_tokens = self.server.prompt_cache.lookup(prompt_text)
+        with self.server.stats_lock:
+            self.server.stats["cached_prompt_tokens"] += cached_tokens
+        usage = {
+            "prompt_tokens": len(prompt_text) // CHARS_PER_TOKEN,
+            "completion_tokens": len(tokens),
+            "total_tokens": 0,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        time.sleep(config["latency"])
+        interval = 1 / config["tokens_per_second"] if config["tokens_per_second"] else 0
+
+        if not request.get("stream"):
+            time.sleep(interval * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, **extra):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": model, "choices": choices}
+            payload.update(extra)
+            self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        # 送信回数を抑えるため、20msごとにまとめて送る
+        batch = max(1, int(config["tokens_per_second"] * 0.02)) if interval else len(tokens)
+        try:
+            for start in range(0, len(tokens), batch):
+                content = "".join(tokens[start:start + batch])
+                event([{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}])
+                time.sleep(interval * batch)
+            event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event([], usage=usage)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアント側で中断された
+            self.close_connection = True
+
+
+class MockOpenAIServer:
+    """スレッドで動作するモックサーバー。with文で起動・停止できる"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=300.0,
+                 error_rate=0.0, retry_after=0.1, seed=None, prompt_cache_min_tokens=PROMPT_CACHE_MIN_TOKENS):
+        self.httpd = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = {
+            "latency": latency,
+            "tokens_per_second": tokens_per_second,
+            "error_rate": error_rate,
+            "retry_after": retry_after,
+        }
+        self.httpd.random = random.Random(seed)
+        self.httpd.prompt_cache = PromptPrefixCache(min_tokens=prompt_cache_min_tokens)
+        self.httpd.stats = {"requests": 0, "errors": 0, "cached_prompt_tokens": 0}
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI互換のモックサーバーを起動します")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="最初の応答までの秒数")
+    parser.add_argument("--tokens-per-second", type=float, default=300.0, help="トークンの送信速度（0で待ちなし）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429/500を返す確率（0〜1）")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=PROMPT_CACHE_MIN_TOKENS,
+                        help="プロンプトキャッシュが効く最小のトークン数")
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.tokens_per_second, args.error_rate,
+                              seed=args.seed, prompt_cache_min_tokens=args.prompt_cache_min_tokens)
+    print(f"モックサーバーを起動しました: {server.base_url}（Ctrl+Cで終了）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
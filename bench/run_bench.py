@@ -0,0 +1,227 @@
+"""ローカルのモックサーバーに対するベンチマーク
+
+実際のAPIを使わずに、次の項目を計測して結果をJSONファイルに書き出す。
+- pipeline: generation.py / openai_client.py の関数で、タイトル生成→記事生成（ストリーミング）を
+  N セッション同時に実行したときのエンドツーエンドの時間・TTFT・スループット
+- app: Streamlit の AppTest で app.py を操作したときのエンドツーエンドの時間、
+  記事表示後のスクリプト再実行時間、SEO評価タブの描画時間
+
+使い方:
+    python -m bench.run_bench --sessions 20 --concurrency 10 -o bench_results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.mock_openai_server import MockOpenAIServer
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+KEYWORDS = ["プログラミング学習", "簡単料理レシピ", "読書感想", "副業体験談"]
+
+
+def _summarize(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": round(ordered[int(0.50 * (len(ordered) - 1))], 2),
+        "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _configure_environment(base_url, workdir):
+    # モックサーバーを向き、キャッシュや計測ファイルは一時ディレクトリに出力する
+    os.environ["OPENAI_API_KEY"] = "sk-bench"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_RPM_LIMIT", "100000")
+    os.environ.setdefault("OPENAI_TPM_LIMIT", "100000000")
+    os.environ.setdefault("OPENAI_RETRY_BASE_DELAY", "0.05")
+    os.environ["RESPONSE_CACHE_PATH"] = os.path.join(workdir, "responses.sqlite3")
+    os.environ["ARTICLE_STORE_PATH"] = os.path.join(workdir, "articles.sqlite3")
+    os.environ["SESSION_ARTIFACT_DIR"] = os.path.join(workdir, "session_artifacts")
+    os.environ["METRICS_PATH"] = os.path.join(workdir, "metrics.jsonl")
+    os.environ["METRICS_PROMETHEUS_PATH"] = os.path.join(workdir, "metrics.prom")
+
+
+def run_pipeline_session(keyword, word_count):
+    """タイトル生成→先頭のタイトルで記事生成（ストリーミング）を1セッション分実行する"""
+    from generation import build_article_request, build_title_request, parse_title_response
+    from openai_client import chat_completion, get_client
+
+    client = get_client()
+    started = time.perf_counter()
+
+    response = chat_completion(client, **build_title_request(keyword))
+    title_options = parse_title_response(response.choices[0].message.content)
+    title_done = time.perf_counter()
+
+    selected = title_options[0]
+    article_request = build_article_request(
+        title=selected["title"],
+        main_keyword=keyword,
+        seo_keywords=selected["seo_keywords"],
+        additional_keywords=[],
+        word_count=word_count,
+        tone="読みやすい"
+    )
+    stream = chat_completion(client, **article_request, stream=True)
+    first_token = None
+    article = ""
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_token is None:
+                first_token = time.perf_counter()
+            article += chunk.choices[0].delta.content
+    finished = time.perf_counter()
+
+    return {
+        "title_ms": (title_done - started) * 1000,
+        "article_ttft_ms": ((first_token or finished) - title_done) * 1000,
+        "article_ms": (finished - title_done) * 1000,
+        "e2e_ms": (finished - started) * 1000,
+        "article_chars": len(article),
+    }
+
+
+def bench_pipeline(sessions, concurrency, word_count):
+    results, errors = [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(run_pipeline_session, KEYWORDS[i % len(KEYWORDS)], word_count)
+            for i in range(sessions)
+        ]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    elapsed = time.perf_counter() - started
+
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "wall_seconds": round(elapsed, 3),
+        "throughput_sessions_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "title_ms": _summarize([r["title_ms"] for r in results]),
+        "article_ttft_ms": _summarize([r["article_ttft_ms"] for r in results]),
+        "article_ms": _summarize([r["article_ms"] for r in results]),
+        "e2e_ms": _summarize([r["e2e_ms"] for r in results]),
+        "errors": errors,
+    }
+
+
+def run_app_session(keyword, timeout):
+    """AppTestでキーワード入力→タイトル生成→選択→記事生成→再実行→SEO評価タブ表示を行う"""
+    from streamlit.testing.v1 import AppTest
+
+    def button(at, label):
+        return next(b for b in at.button if b.label == label)
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    started = time.perf_counter()
+    at.run()
+    at.text_input[0].input(keyword).run()
+    button(at, "➡️ タイトル候補を生成").click().run()
+    at.button(key="select_0").click().run()
+    button(at, "🚀 記事を生成する").click().run()
+    # 記事はバックグラウンドのジョブで生成されるため、完成して表示されるまで再実行を繰り返す
+    deadline = time.monotonic() + timeout
+    while not at.exception and not at.session_state.article_handle and time.monotonic() < deadline:
+        time.sleep(0.05)
+        at.run()
+    finished = time.perf_counter()
+    if at.exception or not at.session_state.article_handle:
+        raise RuntimeError(f"記事の生成に失敗しました: {at.exception or at.error}")
+
+    # 記事表示後、何も変更せずに再実行したときの時間
+    rerun_started = time.perf_counter()
+    at.run()
+    rerun_ms = (time.perf_counter() - rerun_started) * 1000
+
+    # SEO評価タブを開いたときの時間
+    seo_started = time.perf_counter()
+    at.session_state["article_tabs"] = "📊 SEO評価"
+    at.run()
+    seo_tab_ms = (time.perf_counter() - seo_started) * 1000
+
+    return {"e2e_ms": (finished - started) * 1000, "rerun_ms": rerun_ms, "seo_tab_ms": seo_tab_ms}
+
+
+def bench_app(sessions, concurrency, timeout):
+    results, errors = [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_app_session, KEYWORDS[i % len(KEYWORDS)], timeout) for i in range(sessions)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    elapsed = time.perf_counter() - started
+
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "wall_seconds": round(elapsed, 3),
+        "throughput_sessions_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "e2e_ms": _summarize([r["e2e_ms"] for r in results]),
+        "rerun_ms": _summarize([r["rerun_ms"] for r in results]),
+        "seo_tab_ms": _summarize([r["seo_tab_ms"] for r in results]),
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="モックサーバーを使ってアプリの性能を計測します")
+    parser.add_argument("--sessions", type=int, default=8, help="パイプライン計測のセッション数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時に実行するセッション数")
+    parser.add_argument("--app-sessions", type=int, default=2, help="AppTestで実行するセッション数（0で省略）")
+    parser.add_argument("--app-concurrency", type=int, default=1, help="AppTestで同時に実行するセッション数")
+    parser.add_argument("--word-count", type=int, default=2500)
+    parser.add_argument("--latency", type=float, default=0.2, help="モックサーバーの応答待ち時間（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="モックサーバーのトークン送信速度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="モックサーバーが429/500を返す確率")
+    parser.add_argument("--timeout", type=float, default=120.0, help="AppTestの1回の実行のタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=1024,
+                        help="モックサーバーのプロンプトキャッシュが効く最小のトークン数")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="結果を書き出すJSONファイル")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir, MockOpenAIServer(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        prompt_cache_min_tokens=args.prompt_cache_min_tokens,
+    ) as server:
+        _configure_environment(server.base_url, workdir)
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "config": vars(args),
+            "pipeline": bench_pipeline(args.sessions, args.concurrency, args.word_count),
+        }
+        if args.app_sessions:
+            results["app"] = bench_app(args.app_sessions, args.app_concurrency, args.timeout)
+        results["mock_server"] = server.stats
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""リクエストごとの出力トークン数の見積もりとモデルの選択
+
+記事の文字数や出力形式から必要な出力トークン数を見積もり、余裕を持たせた max_tokens を決める
+（上限が必要以上に大きいと、流量制限の枠を無駄に使い、長い出力も止まらない）。
+トークン数は tiktoken がインストールされていればモデルのトークナイザーで数え、
+使えない場合は文字の種類ごとの目安で見積もる。
+
+モデルはステップ（title / article / outline / section）ごとに、環境変数 MODEL_POLICY で
+選んだ方針（quality / balanced / latency）から決める。MODEL_TITLE などで個別に指定もできる。
+"""
+import json
+import logging
+import math
+import os
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# 方針ごとのモデル（balanced: 短いJSONのタイトル生成には軽いモデルを使う）
+MODEL_POLICIES = {
+    "quality": {"title": "gpt-4", "article": "gpt-4o", "outline": "gpt-4o", "section": "gpt-4o"},
+    "balanced": {"title": "gpt-4o-mini", "article": "gpt-3.5-turbo", "outline": "gpt-4o-mini", "section": "gpt-3.5-turbo"},
+    "latency": {"title": "gpt-4o-mini", "article": "gpt-4o-mini", "outline": "gpt-4o-mini", "section": "gpt-4o-mini"},
+}
+DEFAULT_MODEL_POLICY = "balanced"
+
+# モデルごとの出力トークン数の上限（不明なモデルは DEFAULT_MAX_OUTPUT_TOKENS）
+MODEL_MAX_OUTPUT_TOKENS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-4": 4096,
+    "gpt-4o": 16384,
+    "gpt-4o-mini": 16384,
+}
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+# 見積もりに対する余裕（モデルは指定より長めに書くことがある）
+DEFAULT_HEADROOM = 1.3
+
+# 1トークンあたりの比率を測るための、記事本文に近い日本語の文章
+JAPANESE_SAMPLE = """## 副業を始める前に知っておきたいこと
+副業を始めるときは、まず自分の得意なことと使える時間を整理しましょう。
+たとえば平日の夜に1時間、週末に3時間を確保できるなら、ブログ運営やWebライティングから始めるのがおすすめです。
+### 注意点
+会社の就業規則を確認し、確定申告が必要になる所得（年間20万円超）にも注意してください。
+"""
+
+
+def select_model(step):
+    """ステップに使うモデルを返す（MODEL_<STEP> が設定されていればそれを優先する）"""
+    override = os.getenv(f"MODEL_{step.upper()}")
+    if override:
+        return override
+    policy = os.getenv("MODEL_POLICY", DEFAULT_MODEL_POLICY)
+    return MODEL_POLICIES.get(policy, MODEL_POLICIES[DEFAULT_MODEL_POLICY])[step]
+
+
+_fallback_logged = False
+
+
+def _log_fallback(reason):
+    # 概算に切り替えたことはプロセスごとに1回だけ記録する
+    global _fallback_logged
+    if not _fallback_logged:
+        _fallback_logged = True
+        logger.warning("トークナイザーが使えないため、トークン数は文字数からの概算で見積もります: %s", reason)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        _log_fallback("tiktoken がインストールされていません")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # エンコーディングのファイルを取得できない環境（オフラインなど）
+        _log_fallback(f"{model} のエンコーディングを読み込めません（{type(e).__name__}: {e}）")
+        return None
+
+
+def count_tokens(text, model):
+    """text のトークン数を返す（トークナイザーが使えない場合は概算）"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 英数字はおよそ4文字で1トークン、日本語はおよそ1文字1トークン強として見積もる
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) * 1.2)
+
+
+@lru_cache(maxsize=None)
+def tokens_per_char(model):
+    # 日本語の記事本文1文字あたりのトークン数
+    return count_tokens(JAPANESE_SAMPLE, model) / len(JAPANESE_SAMPLE)
+
+
+def headroom():
+    return float(os.getenv("TOKEN_HEADROOM", DEFAULT_HEADROOM))
+
+
+def max_output_tokens(model, expected_tokens):
+    """見積もったトークン数に余裕を持たせ、モデルの上限に収めた max_tokens を返す"""
+    limit = MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+    return min(limit, math.ceil(expected_tokens * headroom()))
+
+
+def text_max_tokens(model, chars, overhead_tokens=0):
+    """約 chars 文字の日本語の文章（＋見出しやキーワード一覧など）に必要な max_tokens"""
+    return max_output_tokens(model, chars * tokens_per_char(model) + overhead_tokens)
+
+
+def json_max_tokens(model, sample):
+    """sample と同程度の大きさのJSONを出力させるのに必要な max_tokens"""
+    return max_output_tokens(model, count_tokens(json.dumps(sample, ensure_ascii=False, indent=2), model))
@@ -0,0 +1,349 @@
+"""記事のまとめてエクスポート（Markdown / HTML / WordPress WXR のZIP）
+
+記事を1件ずつZIPに書き込み、書き込んだ分のバイト列を順に返すジェネレーターとして実装しているため、
+記事が数千件あっても本文をメモリに溜めない（残るのはZIPの目次に載せるファイル名などだけ）。
+WXRは1つのXMLファイルにまとめるため、一時ファイルに書き出してから最後にZIPへ追加する。
+Markdown から HTML への変換は、markdown パッケージがインストールされていればそれを使い、
+ない場合は生成記事で使う書式（見出し・箇条書き・太字・区切り線）だけを変換する。
+
+使い方:
+    python export.py -o articles.zip --format md html wxr
+    python export.py -o batch.zip --input articles.jsonl --format wxr
+"""
+import argparse
+import json
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from html import escape
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+from article_store import get_article_store
+
+FORMATS = ("md", "html", "wxr")
+WXR_FILENAME = "wordpress.xml"
+
+# 書き込んだバイト数がこれを超えたら、そこまでをまとめて返す
+CHUNK_SIZE = 64 * 1024
+
+_INLINE_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_LIST_MARKER = re.compile(r"^[-*]\s+")
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+# ===============================
+# 1記事分の変換
+# ===============================
+
+def article_filename(record, index, ext):
+    """ZIP内のファイル名（番号と、ファイル名に使えない文字を除いたタイトル）"""
+    title = _UNSAFE_FILENAME.sub("_", record["title"]).strip("_")[:60] or "article"
+    number = record.get("id") or index
+    return f"{ext}/{number:05d}_{title}.{ext}"
+
+
+def _yaml_string(value):
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def render_markdown(record):
+    """記事本文の先頭に、キーワードやSEOスコアを front matter として付けたMarkdown"""
+    lines = [
+        "---",
+        f"title: {_yaml_string(record['title'])}",
+        f"keyword: {_yaml_string(record['keyword'])}",
+        f"seo_keywords: [{', '.join(_yaml_string(kw) for kw in record.get('seo_keywords', []))}]",
+        f"additional_keywords: [{', '.join(_yaml_string(kw) for kw in record.get('additional_keywords', []))}]",
+    ]
+    if record.get("seo_score") is not None:
+        lines.append(f"seo_score: {record['seo_score']}")
+    if record.get("created_at"):
+        lines.append(f"date: {_format_time(record['created_at'], '%Y-%m-%dT%H:%M:%S%z')}")
+    lines.append("---")
+    return "\n".join(lines) + "\n\n" + record["article"].strip() + "\n"
+
+
+def _inline(text):
+    return _INLINE_BOLD.sub(r"<strong>\1</strong>", escape(text))
+
+
+def markdown_to_html(text):
+    """記事のMarkdownをHTMLに変換する"""
+    if markdown is not None:
+        return markdown.markdown(text)
+
+    html, paragraph, in_list = [], [], False
+
+    def close_blocks():
+        nonlocal in_list
+        if paragraph:
+            html.append(f"<p>{'<br>'.join(_inline(line) for line in paragraph)}</p>")
+            paragraph.clear()
+        if in_list:
+            html.append("</ul>")
+            in_list = False
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        heading = re.match(r"^(#{1,6})\s+(.+)$", stripped)
+        if heading:
+            close_blocks()
+            level = len(heading.group(1))
+            html.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif re.match(r"^-{3,}$", stripped):
+            close_blocks()
+            html.append("<hr>")
+        elif _LIST_MARKER.match(stripped):
+            if paragraph:
+                close_blocks()
+            if not in_list:
+                html.append("<ul>")
+                in_list = True
+            html.append(f"<li>{_inline(_LIST_MARKER.sub('', stripped))}</li>")
+        elif stripped:
+            if in_list:
+                close_blocks()
+            paragraph.append(stripped)
+        else:
+            close_blocks()
+    close_blocks()
+    return "\n".join(html)
+
+
+def _article_body(record):
+    # タイトル行（# 〜）はHTMLの <h1> / WordPressの投稿タイトルとして別に出力する
+    return re.sub(r"^\s*# .*\n?", "", record["article"], count=1)
+
+
+def _description(record, length=120):
+    # 最初の本文の段落を meta description に使う
+    for line in _article_body(record).splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and not _LIST_MARKER.match(line) and not re.match(r"^-{3,}$", line):
+            line = _INLINE_BOLD.sub(r"\1", line)
+            return line if len(line) <= length else line[:length - 1] + "…"
+    return ""
+
+
+def render_html(record):
+    """SEOのメタデータ（description・keywords・構造化データ）を含むHTML文書"""
+    keywords = list(dict.fromkeys([record["keyword"], *record.get("seo_keywords", []), *record.get("additional_keywords", [])]))
+    structured_data = {
+        "@context": "https://schema.org",
+        "@type": "BlogPosting",
+        "headline": record["title"],
+        "keywords": ", ".join(keywords),
+    }
+    if record.get("created_at"):
+        structured_data["datePublished"] = _format_time(record["created_at"], "%Y-%m-%dT%H:%M:%S%z")
+    # </script> で終わらないよう、JSON中の "</" をエスケープする
+    json_ld = json.dumps(structured_data, ensure_ascii=False).replace("</", "<\\/")
+    meta = [
+        f'<meta name="description" content="{escape(_description(record))}">',
+        f'<meta name="keywords" content="{escape(", ".join(keywords))}">',
+    ]
+    if record.get("seo_score") is not None:
+        meta.append(f'<meta name="seo-score" content="{record["seo_score"]}">')
+
+    return f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{escape(record["title"])}</title>
+{chr(10).join(meta)}
+<script type="application/ld+json">{json_ld}</script>
+</head>
+<body>
+<article>
+<h1>{escape(record["title"])}</h1>
+{markdown_to_html(_article_body(record))}
+</article>
+</body>
+</html>
+"""
+
+
+# ===============================
+# WordPress WXR
+# ===============================
+
+WXR_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"
+    xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"
+    xmlns:content="http://purl.org/rss/1.0/modules/content/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:wp="http://wordpress.org/export/1.2/">
+<channel>
+<title>ブログ記事ジェネレーター</title>
+<language>ja</language>
+<wp:wxr_version>1.2</wp:wxr_version>
+"""
+WXR_FOOTER = """</channel>
+</rss>
+"""
+
+
+def _cdata(text):
+    return "<![CDATA[" + text.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+
+def render_wxr_item(record, index):
+    """1記事分の WXR の <item>（下書きとして取り込まれる）"""
+    created_at = record.get("created_at") or time.time()
+    tags = list(dict.fromkeys([*record.get("seo_keywords", []), *record.get("additional_keywords", [])]))
+    categories = [f'<category domain="category" nicename="{escape(record["keyword"])}">{_cdata(record["keyword"])}</category>']
+    categories += [f'<category domain="post_tag" nicename="{escape(tag)}">{_cdata(tag)}</category>' for tag in tags]
+    return f"""<item>
+<title>{escape(record["title"])}</title>
+<dc:creator>{_cdata("admin")}</dc:creator>
+<content:encoded>{_cdata(markdown_to_html(_article_body(record)))}</content:encoded>
+<excerpt:encoded>{_cdata(_description(record))}</excerpt:encoded>
+<wp:post_id>{record.get("id") or index}</wp:post_id>
+<wp:post_date>{_format_time(created_at, "%Y-%m-%d %H:%M:%S")}</wp:post_date>
+<wp:status>draft</wp:status>
+<wp:post_type>post</wp:post_type>
+{chr(10).join(categories)}
+</item>
+"""
+
+
+def _format_time(timestamp, fmt):
+    return time.strftime(fmt, time.localtime(timestamp))
+
+
+# ===============================
+# ZIPの書き出し
+# ===============================
+
+class _ChunkBuffer:
+    # ZipFile の書き込み先（シークできないストリームとして扱われ、書き込んだ分を順に取り出せる）
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def iter_export_zip(records, formats=FORMATS):
+    """records をZIPに書き込み、ZIPのバイト列を少しずつ返すジェネレーター"""
+    formats = [fmt for fmt in FORMATS if fmt in formats]
+    if not formats:
+        raise ValueError(f"出力形式を {', '.join(FORMATS)} から1つ以上指定してください")
+
+    buffer = _ChunkBuffer()
+    with tempfile.TemporaryFile() as wxr_file:
+        if "wxr" in formats:
+            wxr_file.write(WXR_HEADER.encode("utf-8"))
+
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for index, record in enumerate(records, start=1):
+                if "md" in formats:
+                    archive.writestr(article_filename(record, index, "md"), render_markdown(record))
+                if "html" in formats:
+                    archive.writestr(article_filename(record, index, "html"), render_html(record))
+                if "wxr" in formats:
+                    wxr_file.write(render_wxr_item(record, index).encode("utf-8"))
+                if buffer.size >= CHUNK_SIZE:
+                    yield buffer.drain()
+
+            if "wxr" in formats:
+                wxr_file.write(WXR_FOOTER.encode("utf-8"))
+                wxr_file.seek(0)
+                with archive.open(WXR_FILENAME, "w", force_zip64=True) as entry:
+                    while data := wxr_file.read(CHUNK_SIZE):
+                        entry.write(data)
+                        if buffer.size >= CHUNK_SIZE:
+                            yield buffer.drain()
+        yield buffer.drain()
+
+
+def write_export_zip(records, fileobj, formats=FORMATS):
+    """records のZIPを fileobj に書き込み、書き込んだバイト数を返す"""
+    written = 0
+    for chunk in iter_export_zip(records, formats):
+        fileobj.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def export_to_tempfile(records, formats=FORMATS):
+    """records のZIPをディスク上の一時ファイルに書き出し、先頭に戻したファイルを返す"""
+    fileobj = tempfile.TemporaryFile()
+    write_export_zip(records, fileobj, formats)
+    fileobj.seek(0)
+    return fileobj
+
+
+# ===============================
+# コマンドライン
+# ===============================
+
+def read_jsonl_records(path):
+    """batch.py の出力（JSONL）から、生成に成功した記事を順に返す"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "error" not in record and record.get("article"):
+                yield record
+
+
+def _filter_records(records, keyword=None, since=None, limit=None):
+    count = 0
+    for record in records:
+        if keyword and record["keyword"] != keyword:
+            continue
+        if since and (record.get("created_at") or 0) < since:
+            continue
+        if limit is not None and count >= limit:
+            return
+        count += 1
+        yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成した記事をZIPファイルにまとめてエクスポートします")
+    parser.add_argument("-o", "--output", default="articles.zip", help="書き出すZIPファイル（- で標準出力）")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS), help="出力形式")
+    parser.add_argument("--input", help="batch.py の出力JSONL（省略時は記事履歴のすべての記事）")
+    parser.add_argument("--keyword", help="このメインキーワードの記事だけを出力する")
+    parser.add_argument("--since-hours", type=float, help="この時間以内に生成された記事だけを出力する")
+    parser.add_argument("--limit", type=int, help="出力する最大件数")
+    args = parser.parse_args(argv)
+
+    records = read_jsonl_records(args.input) if args.input else get_article_store().iter_articles()
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    records = _filter_records(records, keyword=args.keyword, since=since, limit=args.limit)
+
+    started = time.perf_counter()
+    if args.output == "-":
+        written = write_export_zip(records, sys.stdout.buffer, args.format)
+    else:
+        with open(args.output, "wb") as f:
+            written = write_export_zip(records, f, args.format)
+    elapsed = time.perf_counter() - started
+    print(f"📦 {written:,}バイトを書き出しました（{elapsed:.1f}秒） → {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,833 @@
+"""記事生成のプロンプト構築と応答解析
+
+Streamlitに依存しない形でまとめ、app.py とバッチ処理（batch.py）の両方から利用する。
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from article_store import get_article_store
+from budget import count_tokens, json_max_tokens, select_model, text_max_tokens
+from metrics import track
+from openai_client import chat_completion
+from seo import IncrementalSeoAnalyzer, KeywordMatcher, evaluate_article
+from similarity import get_duplicate_index
+
+WORD_COUNT_OPTIONS = [1500, 2500, 3500]
+TONE_OPTIONS = ["読みやすい", "専門的", "カジュアル"]
+GENERATION_MODES = ["ストリーミング", "一括生成", "アウトライン並列"]
+
+# 生成中の進捗と途中までの本文を更新する間隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+# プロンプトは「固定の指示（システムメッセージ）→ リクエストごとの値（ユーザーメッセージ）」の順に並べる。
+# 先頭が共通になるため、APIのプロンプトキャッシュが効きやすくなる（固定部分に値を埋め込まないこと）
+TITLE_SYSTEM_PROMPT = """あなたはSEO専門家です。JSON形式でのみ回答してください。
+ユーザーが指定するメインキーワードに基づいて、SEOに強いブログタイトルを5つ提案してください。
+
+【要求事項】
+1. SEOに効果的なタイトル（検索されやすい）
+2. クリックしたくなる魅力的なタイトル
+3. 30文字以内で収める
+4. 各タイトルに最適なSEOキーワードも提案
+
+【出力形式】
+以下のJSON形式で出力してください：
+{
+  "titles": [
+    {
+      "title": "タイトル1",
+      "seo_keywords": ["キーワード1", "キーワード2", "キーワード3"]
+    },
+    {
+      "title": "タイトル2",
+      "seo_keywords": ["キーワード1", "キーワード2", "キーワード3"]
+    }
+  ]
+}
+"""
+
+
+# 出力トークン数の見積もりに使う、想定される応答と同程度の大きさのJSON
+TITLE_OUTPUT_SAMPLE = {
+    "titles": [
+        {"title": "副業体験談から学ぶ失敗しない始め方と続けるコツ完全ガイド", "seo_keywords": ["副業体験談", "副業 始め方", "副業 初心者"]}
+    ] * 5
+}
+OUTLINE_OUTPUT_SAMPLE = {
+    "introduction": ["副業を始めたいけれど何から手をつければよいか迷っている読者の悩み", "この記事を読むとわかること"],
+    "sections": [
+        {
+            "heading": "副業を始める前に確認しておきたい3つのポイント",
+            "points": ["会社の就業規則で副業が認められているかを確認する", "使える時間と目標の収入を決める", "確定申告が必要になる条件を知っておく"],
+            "keywords": ["副業体験談", "副業 始め方", "副業 初心者"],
+        }
+    ] * 4,
+    "summary": ["記事全体の要点の振り返り", "読者が今日からできる次の一歩"],
+}
+
+
+# タイトル生成の応答のJSONスキーマ（Structured Outputs）
+TITLE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "titles": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "seo_keywords": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["title", "seo_keywords"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["titles"],
+    "additionalProperties": False,
+}
+
+# JSONスキーマの指定に対応したモデル（名前の先頭で判定する）
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "o1", "o3", "o4")
+# JSONモード（スキーマなし）に対応したモデル
+JSON_MODE_MODELS = ("gpt-3.5-turbo", "gpt-4-turbo")
+
+
+def _title_response_format(model):
+    if model.startswith(STRUCTURED_OUTPUT_MODELS):
+        return {"type": "json_schema", "json_schema": {"name": "blog_titles", "strict": True, "schema": TITLE_RESPONSE_SCHEMA}}
+    if model.startswith(JSON_MODE_MODELS):
+        return {"type": "json_object"}
+    # 旧来の gpt-4 などはプロンプトの指示だけでJSONを出力させる
+    return None
+
+
+def build_title_request(keyword):
+    title_prompt = f"""【メインキーワード】
+{keyword}
+"""
+    model = select_model("title")
+    request = dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": TITLE_SYSTEM_PROMPT},
+            {"role": "user", "content": title_prompt}
+        ],
+        max_tokens=json_max_tokens(model, TITLE_OUTPUT_SAMPLE),
+        temperature=0.7
+    )
+
+    response_format = _title_response_format(model)
+    if response_format is not None:
+        request["response_format"] = response_format
+    return request
+
+
+def _load_json_response(response_text):
+    # コードブロックで囲まれた応答にも対応する
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0]
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1]
+
+    return json.loads(response_text.strip())
+
+
+def _normalize_title_entry(entry):
+    # {"title", "seo_keywords"} の形になっていない候補は None にする
+    if not isinstance(entry, dict) or not isinstance(entry.get("title"), str) or not entry["title"].strip():
+        return None
+    seo_keywords = entry.get("seo_keywords")
+    if not isinstance(seo_keywords, list):
+        seo_keywords = []
+    return {"title": entry["title"].strip(), "seo_keywords": [str(kw) for kw in seo_keywords if str(kw).strip()]}
+
+
+class TitleStreamParser:
+    """ストリーミングで届くタイトル生成のJSONを少しずつ解析し、完成した候補から順に取り出す
+
+    配列の要素になっているオブジェクト（{"title", "seo_keywords"}）が閉じた時点で1件として解析する。
+    応答が途中で切れても、それまでに完成した候補は titles に残る。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.titles = []
+        self._position = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._entry_start = None
+
+    def feed(self, chunk):
+        """chunk を追加し、新たに完成した候補のリストを返す"""
+        self.text += chunk
+        text = self.text
+        completed = []
+        for position in range(self._position, len(text)):
+            ch = text[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._stack and self._stack[-1] == "[" and self._entry_start is None:
+                    self._entry_start = position
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and self._entry_start is not None and self._stack and self._stack[-1] == "[":
+                    try:
+                        entry = _normalize_title_entry(json.loads(text[self._entry_start:position + 1]))
+                    except ValueError:
+                        entry = None
+                    self._entry_start = None
+                    if entry is not None:
+                        self.titles.append(entry)
+                        completed.append(entry)
+        self._position = len(text)
+        return completed
+
+
+def parse_title_response(response_text):
+    """タイトル生成の応答から [{"title", "seo_keywords"}, ...] を取り出す
+
+    応答全体をJSONとして解析できない場合（途中で切れた場合など）は、完成している候補だけを返す。
+    """
+    try:
+        titles = _load_json_response(response_text)["titles"]
+    except (ValueError, KeyError, TypeError, IndexError):
+        parser = TitleStreamParser()
+        parser.feed(response_text)
+        titles = parser.titles
+    titles = [entry for entry in map(_normalize_title_entry, titles if isinstance(titles, list) else []) if entry]
+    if not titles:
+        raise ValueError("タイトル候補を応答から読み取れませんでした")
+    return titles
+
+
+ARTICLE_SYSTEM_PROMPT = """あなたは優秀なSEOライターです。高品質で検索エンジンに評価される記事を作成してください。
+ユーザーが指定する【記事情報】の条件で、ブログ記事を作成してください。
+
+【要求事項】
+1. SEOキーワードと追加キーワードを自然に配置
+2. 読者にとって有益で実用的な内容
+3. 見出し構成を明確に
+4. 導入→本文→まとめの構成
+5. 専門性と信頼性を重視
+6. 設定されたキーワードを記事内容に反映させる
+7. 指定された文字数とトーンで執筆する
+
+【出力形式】
+# [タイトル]
+
+## はじめに
+[読者の興味を引く導入文]
+
+## [見出し2-1]
+[内容1]
+
+## [見出し2-2]
+[内容2]
+
+## [見出し2-3]
+[内容3]
+
+## まとめ
+[記事のまとめと読者へのメッセージ]
+
+---
+【この記事のキーワード】
+- メインキーワード: [メインキーワード]
+- SEOキーワード: [SEOキーワード（なければ「なし」）]
+- 追加キーワード: [追加キーワード（なければこの行は書かない）]
+"""
+
+
+def _article_info(title, main_keyword, seo_keywords, additional_keywords, word_count, tone):
+    return f"""【記事情報】
+- タイトル: {title}
+- メインキーワード: {main_keyword}
+- SEOキーワード: {', '.join(seo_keywords) if seo_keywords else 'なし'}
+- 追加キーワード: {', '.join(additional_keywords) if additional_keywords else 'なし'}
+- 文字数: 約{word_count}文字
+- トーン: {tone}
+"""
+
+
+def _diversity_hint(similar_titles):
+    # 既存の記事と似た内容になった場合に、切り口を変えるよう指示する
+    if not similar_titles:
+        return ""
+    titles = "\n".join(f"- {title}" for title in similar_titles)
+    return f"""
+【既存の記事との重複を避ける】
+次の記事と内容がほぼ同じになっています。切り口・具体例・構成を変えて、これらとは異なる独自の内容にしてください。
+{titles}
+"""
+
+
+def build_article_request(title, main_keyword, seo_keywords, additional_keywords, word_count, tone, similar_titles=()):
+    article_prompt = _article_info(title, main_keyword, seo_keywords, additional_keywords, word_count, tone)
+    article_prompt += _diversity_hint(similar_titles)
+    model = select_model("article")
+    # 本文の文字数に加えて、タイトル行と末尾のキーワード一覧の分を見込む
+    overhead_tokens = count_tokens(
+        f"# {title}\n" + build_keywords_footer(main_keyword, seo_keywords, additional_keywords), model
+    )
+
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": ARTICLE_SYSTEM_PROMPT},
+            {"role": "user", "content": article_prompt}
+        ],
+        max_tokens=text_max_tokens(model, word_count, overhead_tokens),
+        temperature=0.7
+    )
+
+
+# ===============================
+# アウトライン → セクション並列生成
+# ===============================
+
+OUTLINE_SYSTEM_PROMPT = """あなたは優秀なSEOライターです。JSON形式でのみ回答してください。
+ユーザーが指定する【記事情報】の条件で、ブログ記事の構成案（アウトライン）を作成してください。
+
+【要求事項】
+1. 「はじめに」と「まとめ」の間に本文の見出し（H2）を3つ設ける
+2. 各見出しで扱う要点を2〜3個挙げる
+3. SEOキーワードと追加キーワードを各見出しに割り振る（すべてのキーワードをどこかに含める）
+
+【出力形式】
+以下のJSON形式で出力してください：
+{
+  "introduction": ["導入で触れる要点1", "要点2"],
+  "sections": [
+    {
+      "heading": "見出し2-1",
+      "points": ["要点1", "要点2"],
+      "keywords": ["キーワード1", "キーワード2"]
+    }
+  ],
+  "summary": ["まとめで触れる要点1", "要点2"]
+}
+"""
+
+
+def build_outline_request(title, main_keyword, seo_keywords, additional_keywords, word_count, tone, similar_titles=()):
+    outline_prompt = _article_info(title, main_keyword, seo_keywords, additional_keywords, word_count, tone)
+    outline_prompt += _diversity_hint(similar_titles)
+    model = select_model("outline")
+
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": OUTLINE_SYSTEM_PROMPT},
+            {"role": "user", "content": outline_prompt}
+        ],
+        max_tokens=json_max_tokens(model, OUTLINE_OUTPUT_SAMPLE),
+        temperature=0.7
+    )
+
+
+def parse_outline_response(response_text, keywords):
+    """アウトラインを解析し、各見出しにキーワードが割り振られた状態にして返す"""
+    outline_data = _load_json_response(response_text)
+
+    sections = [
+        {
+            "heading": str(section.get("heading", "")).strip(),
+            "points": list(section.get("points") or []),
+            "keywords": [kw for kw in (section.get("keywords") or []) if kw in keywords],
+        }
+        for section in outline_data.get("sections") or []
+        if str(section.get("heading", "")).strip()
+    ]
+    if not sections:
+        raise ValueError("アウトラインに見出しが含まれていません")
+
+    # どの見出しにも割り振られなかったキーワードは、割り当ての少ない見出しから順に追加する
+    assigned = {kw for section in sections for kw in section["keywords"]}
+    for keyword in keywords:
+        if keyword not in assigned:
+            min(sections, key=lambda section: len(section["keywords"]))["keywords"].append(keyword)
+            assigned.add(keyword)
+
+    return {
+        "introduction": list(outline_data.get("introduction") or []),
+        "sections": sections,
+        "summary": list(outline_data.get("summary") or []),
+    }
+
+
+SECTION_SYSTEM_PROMPT = """あなたは優秀なSEOライターです。高品質で検索エンジンに評価される記事を作成してください。
+ユーザーが指定するブログ記事のうち、【執筆する見出し】の本文だけを執筆してください。
+
+【要求事項】
+1. 【文字数】で指定された文字数で執筆する
+2. 見出し行（## で始まる行）は書かず、本文から始める
+3. 必要に応じて ### の小見出しを使ってよい
+4. 他の見出しの内容と重複させない
+5. 【この見出しで扱う要点】と【この見出しに含めるキーワード】を反映させる
+"""
+
+
+def build_section_requests(outline, title, main_keyword, word_count, tone):
+    """はじめに・各見出し・まとめの本文を生成するリクエストを、記事の順番で返す
+
+    戻り値は (見出し, リクエスト) のリスト。
+    """
+    sections = outline["sections"]
+    # 文字数は導入とまとめに1割ずつ、残りを本文の見出しで均等に配分する
+    edge_chars = max(word_count // 10, 150)
+    section_chars = max((word_count - edge_chars * 2) // len(sections), 300)
+    all_headings = "、".join(section["heading"] for section in sections)
+
+    parts = [("はじめに", outline["introduction"], [main_keyword], edge_chars)]
+    for section in sections:
+        parts.append((section["heading"], section["points"], section["keywords"], section_chars))
+    parts.append(("まとめ", outline["summary"], [main_keyword], edge_chars))
+
+    # 記事全体の情報を先に置き、同じ記事のセクション間でも先頭を共通にする
+    article_info = f"""【記事情報】
+- タイトル: {title}
+- メインキーワード: {main_keyword}
+- 記事全体の見出し: はじめに、{all_headings}、まとめ
+- トーン: {tone}
+"""
+
+    model = select_model("section")
+    requests = []
+    for heading, points, keywords, target_chars in parts:
+        section_prompt = f"""{article_info}
+【執筆する見出し】
+{heading}
+
+【この見出しで扱う要点】
+{chr(10).join(f"- {point}" for point in points) if points else "- 見出しに沿って自由に"}
+
+【この見出しに含めるキーワード】
+{', '.join(keywords) if keywords else 'なし'}
+
+【文字数】
+約{target_chars}文字
+"""
+        requests.append((heading, dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": SECTION_SYSTEM_PROMPT},
+                {"role": "user", "content": section_prompt}
+            ],
+            max_tokens=text_max_tokens(model, target_chars),
+            temperature=0.7
+        )))
+    return requests
+
+
+def generate_sections_concurrently(client, section_requests, max_workers=None):
+    """セクションの本文を並列に生成し、完了した順に (番号, 本文, トークン使用量) を返す"""
+    def generate(request):
+        with track("article_section", model=request["model"]) as span:
+            response = chat_completion(client, **request)
+            span.record_usage(response.usage)
+        return response.choices[0].message.content, response.usage
+
+    if not section_requests:
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(section_requests))
+    futures = {
+        executor.submit(generate, request): index
+        for index, (_, request) in enumerate(section_requests)
+    }
+    try:
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+    finally:
+        # 途中で中断された場合は、未着手のリクエストを取り消して待たずに戻る
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _strip_heading(heading, body):
+    # 指示に反して見出し行を書いてきた場合は取り除く
+    lines = body.strip().splitlines()
+    if lines and lines[0].lstrip("#").strip() == heading and lines[0].startswith("#"):
+        lines = lines[1:]
+    return "\n".join(lines).strip()
+
+
+def build_keywords_footer(main_keyword, seo_keywords, additional_keywords):
+    footer = f"""---
+【この記事のキーワード】
+- メインキーワード: {main_keyword}
+- SEOキーワード: {', '.join(seo_keywords) if seo_keywords else 'なし'}
+"""
+    if additional_keywords:
+        footer += f"- 追加キーワード: {', '.join(additional_keywords)}\n"
+    return footer
+
+
+def assemble_article(title, headings, bodies, footer=""):
+    """見出しと本文を記事の順番に並べ、Markdownの記事に組み立てる
+
+    bodies で未生成の部分（None）は省略する。
+    """
+    parts = [f"# {title}"]
+    for heading, body in zip(headings, bodies):
+        if body is not None:
+            parts.append(f"## {heading}\n{_strip_heading(heading, body)}")
+    if footer:
+        parts.append(footer)
+    return "\n\n".join(parts)
+
+
+# ===============================
+# 見出し単位の部分再生成
+# ===============================
+
+SECTION_HEADING_PATTERN = re.compile(r'^## (.+)$', re.MULTILINE)
+FOOTER_PATTERN = re.compile(r'\n-{3,}\s*\n【この記事のキーワード】')
+
+REWRITE_SYSTEM_PROMPT = """あなたは優秀なSEOライターです。高品質で検索エンジンに評価される記事を作成してください。
+ユーザーが指定するブログ記事のうち、【執筆する見出し】の本文を指示に従って書き直してください。
+
+【要求事項】
+1. 【現在の本文】の内容と構成をできるだけ保ち、必要な箇所だけを書き直す
+2. 【追加するキーワード】を自然に含める
+3. 【削除するキーワード】は使わない
+4. 【記事情報】のトーンに合わせた文体にする
+5. 見出し行（## で始まる行）は書かず、本文から始める
+6. 【文字数】で指定された文字数で執筆する
+"""
+
+
+def split_article(article):
+    """記事を (見出しより前の部分, [(見出し, 本文), ...], 末尾のキーワード一覧) に分ける"""
+    footer = ""
+    footer_match = None
+    for footer_match in FOOTER_PATTERN.finditer(article):
+        pass
+    if footer_match is not None:
+        footer = article[footer_match.start():].strip()
+        article = article[:footer_match.start()]
+
+    headings = list(SECTION_HEADING_PATTERN.finditer(article))
+    preamble = article[:headings[0].start()] if headings else article
+    sections = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(article)
+        sections.append((match.group(1).strip(), article[match.end():end].strip()))
+    return preamble.strip(), sections, footer
+
+
+def join_article(preamble, sections, footer=""):
+    parts = [preamble] if preamble else []
+    parts += [f"## {heading}\n{body}" for heading, body in sections]
+    if footer:
+        parts.append(footer)
+    return "\n\n".join(parts)
+
+
+def plan_section_rewrite(article, previous_keywords, keywords, tone_changed=False):
+    """キーワードやトーンの変更で書き直しが必要な見出しを求める
+
+    追加されたキーワードは、キーワードの出現が少ない本文の見出しから順に割り振り、
+    削除されたキーワードは、それを含む見出しから取り除く。トーンを変えた場合はすべての見出しが対象になる。
+    戻り値は {見出しの番号: {"add": [...], "remove": [...]}}（対象の見出しのみ）。
+    """
+    _, sections, _ = split_article(article)
+    if not sections:
+        return {}
+    added = [kw for kw in dict.fromkeys(keywords) if kw and kw not in previous_keywords]
+    removed = [kw for kw in dict.fromkeys(previous_keywords) if kw and kw not in keywords]
+
+    plan = {index: {"add": [], "remove": []} for index in range(len(sections))} if tone_changed else {}
+
+    if removed:
+        removed_matcher = KeywordMatcher(removed)
+        for index, (_, body) in enumerate(sections):
+            found = [kw for kw, count in removed_matcher.count(body).items() if count]
+            if found:
+                plan.setdefault(index, {"add": [], "remove": []})["remove"] += found
+
+    if added:
+        # はじめに・まとめ以外の見出しがあれば、そちらに割り振る
+        candidates = [index for index, (heading, _) in enumerate(sections) if heading not in ("はじめに", "まとめ")]
+        candidates = candidates or list(range(len(sections)))
+        matcher = KeywordMatcher(keywords)
+        load = {index: sum(matcher.count(sections[index][1]).values()) for index in candidates}
+        for keyword in added:
+            index = min(candidates, key=lambda i: load[i])
+            plan.setdefault(index, {"add": [], "remove": []})["add"].append(keyword)
+            load[index] += 1
+
+    return dict(sorted(plan.items()))
+
+
+def build_rewrite_requests(article, plan, title, main_keyword, tone):
+    """plan の見出しを書き直すリクエストを (見出しの番号, 見出し, リクエスト) のリストで返す"""
+    _, sections, _ = split_article(article)
+    all_headings = "、".join(heading for heading, _ in sections)
+    article_info = f"""【記事情報】
+- タイトル: {title}
+- メインキーワード: {main_keyword}
+- 記事全体の見出し: {all_headings}
+- トーン: {tone}
+"""
+
+    model = select_model("section")
+    requests = []
+    for index, changes in plan.items():
+        heading, body = sections[index]
+        rewrite_prompt = f"""{article_info}
+【執筆する見出し】
+{heading}
+
+【追加するキーワード】
+{', '.join(changes["add"]) if changes["add"] else 'なし'}
+
+【削除するキーワード】
+{', '.join(changes["remove"]) if changes["remove"] else 'なし'}
+
+【文字数】
+約{len(body)}文字
+
+【現在の本文】
+{body}
+"""
+        requests.append((index, heading, dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": REWRITE_SYSTEM_PROMPT},
+                {"role": "user", "content": rewrite_prompt}
+            ],
+            max_tokens=text_max_tokens(model, len(body)),
+            temperature=0.7
+        )))
+    return requests
+
+
+def add_token_usage(total, usage):
+    # APIが返したトークン使用量を合計する
+    if usage is not None:
+        total["prompt_tokens"] += usage.prompt_tokens or 0
+        total["completion_tokens"] += usage.completion_tokens or 0
+
+
+def _generate_in_one_request(job, client, params, token_usage):
+    article_request = build_article_request(
+        title=params["title"],
+        main_keyword=params["keyword"],
+        seo_keywords=params["seo_keywords"],
+        additional_keywords=params["additional_keywords"],
+        word_count=params["word_count"],
+        tone=params["tone"],
+        similar_titles=params.get("similar_titles", ())
+    )
+    streaming = params["mode"] == "ストリーミング"
+    # ストリーミングでは最後のチャンクでトークン使用量を受け取る
+    stream_options = {"stream_options": {"include_usage": True}} if streaming else {}
+    job.update(message="🤖 記事を執筆しています...")
+
+    with track("article", model=article_request["model"], mode=params["mode"], speculative=params.get("speculative")) as span:
+        response = chat_completion(client, **article_request, stream=streaming, **stream_options)
+        if not streaming:
+            span.record_usage(response.usage)
+            add_token_usage(token_usage, response.usage)
+            return response.choices[0].message.content
+
+        word_count = params["word_count"]
+        # 受信した分だけSEO評価を更新し、生成中も評価を確認できるようにする
+        analyzer = IncrementalSeoAnalyzer(params["title"], params["seo_keywords"], params["additional_keywords"])
+        article = ""
+        received_tokens = 0
+        last_update = 0.0
+        try:
+            for chunk in response:
+                job.check_cancelled()
+                if chunk.usage is not None:
+                    span.record_usage(chunk.usage)
+                    add_token_usage(token_usage, chunk.usage)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                span.first_token()
+                delta = chunk.choices[0].delta.content
+                article += delta
+                analyzer.feed(delta)
+                received_tokens += 1
+
+                # 表示用の値の更新は一定間隔に間引く
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_INTERVAL:
+                    last_update = now
+                    job.update(
+                        progress=min(len(article) / word_count, 0.99),
+                        message=f"✍️ 記事を執筆しています... {len(article):,} / 約{word_count:,}文字（{received_tokens:,}トークン受信）",
+                        partial_text=article,
+                        seo=analyzer.evaluate()
+                    )
+        finally:
+            # 停止した場合もHTTP接続を閉じて、サーバー側の生成を止める
+            response.close()
+            job.update(partial_text=article, seo=analyzer.evaluate())
+    return article
+
+
+def _generate_by_outline(job, client, params, token_usage):
+    # 構成案（アウトライン）を作成してから、各見出しの本文を並列に生成する
+    title = params["title"]
+    job.update(message="🤖 記事構成を考えています...")
+    outline_request = build_outline_request(
+        title=title,
+        main_keyword=params["keyword"],
+        seo_keywords=params["seo_keywords"],
+        additional_keywords=params["additional_keywords"],
+        word_count=params["word_count"],
+        tone=params["tone"],
+        similar_titles=params.get("similar_titles", ())
+    )
+    with track("outline", model=outline_request["model"], speculative=params.get("speculative")) as span:
+        outline_response = chat_completion(client, **outline_request)
+        span.record_usage(outline_response.usage)
+    add_token_usage(token_usage, outline_response.usage)
+    job.check_cancelled()
+
+    outline = parse_outline_response(
+        outline_response.choices[0].message.content,
+        list(params["seo_keywords"]) + list(params["additional_keywords"])
+    )
+    section_requests = build_section_requests(outline, title, params["keyword"], params["word_count"], params["tone"])
+    headings = [heading for heading, _ in section_requests]
+    bodies = [None] * len(section_requests)
+    job.update(progress=0.1, message=f"✍️ {len(headings)}個のセクションを並列で執筆しています...")
+
+    # 完成したセクションから順に、記事の順番どおりに組み立てる
+    for completed, (index, body, usage) in enumerate(generate_sections_concurrently(client, section_requests), start=1):
+        job.check_cancelled()
+        bodies[index] = body
+        add_token_usage(token_usage, usage)
+        # セクションは順不同で完成するため、組み立てた記事全体を評価し直す（セクション数の回数だけ）
+        partial_article = assemble_article(title, headings, bodies)
+        job.update(
+            progress=0.1 + 0.9 * completed / len(bodies),
+            message=f"✍️ セクションを執筆しています... {completed}/{len(bodies)}（「{headings[index]}」が完成）",
+            partial_text=partial_article,
+            seo=evaluate_article(partial_article, title, params["seo_keywords"], params["additional_keywords"])
+        )
+
+    return assemble_article(
+        title,
+        headings,
+        bodies,
+        build_keywords_footer(params["keyword"], params["seo_keywords"], params["additional_keywords"])
+    )
+
+
+def run_article_job(job, client, params):
+    """記事を生成して記事ストアに保存する（jobs.JobExecutor で実行するジョブ）
+
+    params は keyword, title, seo_keywords, additional_keywords, word_count, tone, mode を持つ辞書
+    （先読み生成の場合は speculative=True を加え、計測結果で区別できるようにする）。
+    avoid_duplicates=True の場合、既存の記事とほぼ同じ内容になったら切り口を変えて1回だけ再生成する。
+    記事ストアの保存内容と同じ形式の辞書を返す。先読み生成の記事は使われるまで保存せず、
+    使われた時点で save_article_record() を呼び出す。
+    """
+    token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    generate = _generate_by_outline if params["mode"] == "アウトライン並列" else _generate_in_one_request
+    article = generate(job, client, params, token_usage)
+
+    duplicates = get_duplicate_index().find(article)
+    if duplicates and params.get("avoid_duplicates"):
+        job.update(progress=0.0, message=f"🔁 既存の記事「{duplicates[0]['title']}」と似ているため、切り口を変えて再生成しています...")
+        params = dict(params, similar_titles=list(dict.fromkeys(match["title"] for match in duplicates)))
+        article = generate(job, client, params, token_usage)
+
+    evaluation = evaluate_article(article, params["title"], params["seo_keywords"], params["additional_keywords"])
+    record = {
+        "keyword": params["keyword"],
+        "title": params["title"],
+        "seo_keywords": list(params["seo_keywords"]),
+        "additional_keywords": list(params["additional_keywords"]),
+        "word_count": params["word_count"],
+        "tone": params["tone"],
+        "article": article,
+        "seo_score": evaluation["seo_score"],
+        "generation_mode": params["mode"],
+        **token_usage,
+    }
+    if params.get("speculative"):
+        job.update(speculative=True)
+    else:
+        save_article_record(record)
+    return record
+
+
+def save_article_record(record):
+    """生成した記事を記事ストアに保存する（類似記事の索引には、書き込みの完了後に取り込まれる）"""
+    # 書き込みはバックグラウンドで行われる
+    get_article_store().save(**record)
+
+
+def run_section_rewrite_job(job, client, params):
+    """表示中の記事のうち、キーワードやトーンの変更の影響がある見出しだけを書き直すジョブ
+
+    params は run_article_job() の項目に加えて、article（現在の記事）、previous_keywords
+    （現在の記事のSEOキーワードと追加キーワード）、previous_tone を持つ辞書。
+    """
+    token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    keywords = list(params["seo_keywords"]) + list(params["additional_keywords"])
+    plan = plan_section_rewrite(
+        params["article"], params["previous_keywords"], keywords, params["tone"] != params["previous_tone"]
+    )
+    preamble, sections, footer = split_article(params["article"])
+    # タイトルは置換テンプレートとして解釈させない（"\" を含むタイトルがあるため）
+    preamble = re.sub(r'^# .*$', lambda _: f"# {params['title']}", preamble, count=1, flags=re.MULTILINE)
+    if footer:
+        footer = build_keywords_footer(params["keyword"], params["seo_keywords"], params["additional_keywords"])
+
+    rewrite_requests = build_rewrite_requests(params["article"], plan, params["title"], params["keyword"], params["tone"])
+    if rewrite_requests:
+        job.update(progress=0.05, message=f"✍️ {len(rewrite_requests)}/{len(sections)}個の見出しを書き直しています...")
+    else:
+        # タイトルだけの変更は、APIを呼び出さずにタイトル行とキーワード欄だけを差し替える
+        job.update(progress=0.95, message="✍️ タイトルを差し替えています...")
+
+    for completed, (index, body, usage) in enumerate(generate_sections_concurrently(
+        client, [(heading, request) for _, heading, request in rewrite_requests]
+    ), start=1):
+        job.check_cancelled()
+        section_index, heading, _ = rewrite_requests[index]
+        sections[section_index] = (heading, _strip_heading(heading, body))
+        add_token_usage(token_usage, usage)
+        partial_article = join_article(preamble, sections, footer)
+        job.update(
+            progress=0.05 + 0.95 * completed / len(rewrite_requests),
+            message=f"✍️ 見出しを書き直しています... {completed}/{len(rewrite_requests)}（「{heading}」が完成）",
+            partial_text=partial_article,
+            seo=evaluate_article(partial_article, params["title"], params["seo_keywords"], params["additional_keywords"])
+        )
+
+    article = join_article(preamble, sections, footer)
+    evaluation = evaluate_article(article, params["title"], params["seo_keywords"], params["additional_keywords"])
+    record = {
+        "keyword": params["keyword"],
+        "title": params["title"],
+        "seo_keywords": list(params["seo_keywords"]),
+        "additional_keywords": list(params["additional_keywords"]),
+        "word_count": params["word_count"],
+        "tone": params["tone"],
+        "article": article,
+        "seo_score": evaluation["seo_score"],
+        "generation_mode": "部分再生成",
+        **token_usage,
+    }
+    get_article_store().save(**record)
+    return record
@@ -0,0 +1,158 @@
+"""生成処理をバックグラウンドで実行するジョブ管理
+
+Streamlitのスクリプトは操作のたびに最初から再実行されるため、APIの呼び出しを
+スクリプトのスレッドで行うと画面が固まり、再実行で処理が中断されてしまう。
+ここではサーバープロセスが持つスレッドプールでジョブを実行し、スクリプトからは
+ジョブの状態（進捗・途中までの本文・結果）を読み取るだけにする。
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import get_metrics
+
+DEFAULT_MAX_WORKERS = 8
+
+# 完了したジョブを保持する秒数（この時間を過ぎると一覧から消える）
+DEFAULT_RETENTION_SECONDS = 60 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """ジョブの停止が要求されたときに、ジョブの関数から送出する"""
+
+
+class Job:
+    def __init__(self, session_id, label):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "順番を待っています..."
+        self.partial_text = ""
+        # 途中経過としてジョブの関数が自由に設定する値（SEO評価など）
+        self.details = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def update(self, progress=None, message=None, partial_text=None, **details):
+        # ジョブのスレッドから呼び出し、スクリプト側は次の再実行で読み取る
+        if progress is not None:
+            self.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        if partial_text is not None:
+            self.partial_text = partial_text
+        if details:
+            self.details = dict(self.details, **details)
+
+
+class JobExecutor:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, session_id, label, fn, *args, **kwargs):
+        """fn(job, *args, **kwargs) をバックグラウンドで実行するジョブを登録する"""
+        job = Job(session_id, label)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        try:
+            job.check_cancelled()
+            job.status = RUNNING
+            job.message = "実行中..."
+            job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+            job.progress = 1.0
+            job.message = "完了しました"
+        except JobCancelled:
+            job.status = CANCELLED
+            job.message = "停止しました"
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            job.message = f"エラーが発生しました: {e}"
+        finally:
+            job.finished_at = time.time()
+            get_metrics().record(
+                "job",
+                (job.finished_at - job.started_at) * 1000,
+                queue_ms=round((job.started_at - job.created_at) * 1000, 2),
+                status=job.status,
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, session_id):
+        """セッションのジョブを登録順に返す"""
+        with self._lock:
+            self._prune()
+            return sorted(
+                (job for job in self._jobs.values() if job.session_id == session_id),
+                key=lambda job: job.created_at,
+            )
+
+    def discard(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.cancel()
+
+    def _prune(self):
+        # 閉じられたセッションのジョブも残らないよう、完了から一定時間たったものを消す
+        expires = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < expires]:
+            del self._jobs[job_id]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """プロセス共有のジョブ実行環境を返す（同時実行数は環境変数 JOB_MAX_WORKERS で変更できる）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor(
+                max_workers=int(os.getenv("JOB_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+                retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", DEFAULT_RETENTION_SECONDS)),
+            )
+    return _executor
@@ -0,0 +1,241 @@
+"""生成ステップごとの計測（処理時間・トークン数）
+
+各ステップの計測結果は、ローテーションするJSONLファイルへ1行ずつ記録する。
+直近の結果はメモリにも保持し、p50/p95の集計とPrometheusテキスト形式の出力に使う
+（textfile collector で読み込めるよう、スナップショットをファイルにも書き出す）。
+スナップショットの書き出しはバックグラウンドのスレッドで一定間隔ごとにまとめて行い、
+記録する側（UIスレッド）では集計しない。
+"""
+import json
+import logging
+import logging.handlers
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+DEFAULT_METRICS_PATH = os.path.join(".cache", "metrics.jsonl")
+DEFAULT_PROMETHEUS_PATH = os.path.join(".cache", "metrics.prom")
+# スナップショットを書き出す最短の間隔（秒）
+DEFAULT_PROMETHEUS_INTERVAL = 15.0
+
+# 集計に使う直近の件数（ステップごと）
+RECENT_EVENTS_PER_STEP = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """1ステップ分の計測値。track() のブロック内で値を設定する"""
+
+    def __init__(self, step, **fields):
+        self.step = step
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.ttft_ms = None
+
+    def first_token(self):
+        # 最初のトークンを受信した時点を記録する（2回目以降は無視）
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.started) * 1000
+
+    def record_usage(self, usage):
+        if usage is None:
+            return
+        self.fields["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        self.fields["completion_tokens"] = getattr(usage, "completion_tokens", None)
+        # プロンプトキャッシュから読み込まれたトークン数（対応していない場合は None）
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.fields["cached_tokens"] = getattr(details, "cached_tokens", None)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+class MetricsRecorder:
+    def __init__(self, path=DEFAULT_METRICS_PATH, prometheus_path=DEFAULT_PROMETHEUS_PATH,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, prometheus_interval=DEFAULT_PROMETHEUS_INTERVAL):
+        self.prometheus_path = prometheus_path
+        self.prometheus_interval = prometheus_interval
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=RECENT_EVENTS_PER_STEP))
+        self._totals = defaultdict(lambda: defaultdict(float))
+
+        self._logger = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(handler)
+
+        # 前回のスナップショット以降に記録があったかどうか
+        self._snapshot_pending = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        if prometheus_path:
+            threading.Thread(target=self._snapshot_loop, name="metrics-prometheus-writer", daemon=True).start()
+
+    def record(self, step, wall_ms, **fields):
+        event = {"ts": time.time(), "step": step, "wall_ms": round(wall_ms, 2)}
+        event.update((key, value) for key, value in fields.items() if value is not None)
+
+        with self._lock:
+            self._recent[step].append(event)
+            totals = self._totals[step]
+            totals["count"] += 1
+            totals["wall_ms_sum"] += wall_ms
+            totals["errors"] += 1 if event.get("error") else 0
+            totals["cache_hits"] += 1 if event.get("cache_hit") else 0
+            totals["prompt_tokens"] += event.get("prompt_tokens") or 0
+            totals["completion_tokens"] += event.get("completion_tokens") or 0
+            totals["cached_tokens"] += event.get("cached_tokens") or 0
+
+        if self._logger is not None:
+            self._logger.info(json.dumps(event, ensure_ascii=False))
+        if self.prometheus_path:
+            self._snapshot_pending.set()
+        return event
+
+    def summary(self):
+        """ステップごとの件数・p50/p95などを返す（管理パネル表示用）"""
+        with self._lock:
+            recent = {step: list(events) for step, events in self._recent.items()}
+            totals = {step: dict(values) for step, values in self._totals.items()}
+
+        rows = []
+        for step in sorted(totals):
+            events = recent.get(step, [])
+            wall = [event["wall_ms"] for event in events]
+            ttft = [event["ttft_ms"] for event in events if "ttft_ms" in event]
+            count = totals[step]["count"]
+            prompt_tokens = totals[step]["prompt_tokens"]
+            rows.append({
+                "step": step,
+                "count": int(count),
+                "p50_ms": _percentile(wall, 50),
+                "p95_ms": _percentile(wall, 95),
+                "ttft_p50_ms": _percentile(ttft, 50),
+                "ttft_p95_ms": _percentile(ttft, 95),
+                "cache_hit_rate": totals[step]["cache_hits"] / count if count else 0.0,
+                "errors": int(totals[step]["errors"]),
+                "prompt_tokens": int(prompt_tokens),
+                "completion_tokens": int(totals[step]["completion_tokens"]),
+                "cached_tokens": int(totals[step]["cached_tokens"]),
+                "prompt_cache_hit_rate": totals[step]["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+            })
+        return rows
+
+    def prometheus_text(self):
+        """Prometheusのテキスト形式でスナップショットを返す"""
+        lines = [
+            "# HELP blog_generator_step_duration_ms Wall time of each generation step.",
+            "# TYPE blog_generator_step_duration_ms summary",
+        ]
+        rows = self.summary()
+        with self._lock:
+            totals = {step: dict(values) for step, values in self._totals.items()}
+
+        for row in rows:
+            step = row["step"]
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+                if row[key] is not None:
+                    lines.append(f'blog_generator_step_duration_ms{{step="{step}",quantile="{quantile}"}} {row[key]:.2f}')
+            lines.append(f'blog_generator_step_duration_ms_sum{{step="{step}"}} {totals[step]["wall_ms_sum"]:.2f}')
+            lines.append(f'blog_generator_step_duration_ms_count{{step="{step}"}} {row["count"]}')
+
+        for name, key, help_text in (
+            ("blog_generator_step_errors_total", "errors", "Failed generation steps."),
+            ("blog_generator_cache_hits_total", "cache_hits", "Generation steps served from cache."),
+            ("blog_generator_prompt_tokens_total", "prompt_tokens", "Prompt tokens reported by the API."),
+            ("blog_generator_completion_tokens_total", "completion_tokens", "Completion tokens reported by the API."),
+            ("blog_generator_cached_tokens_total", "cached_tokens", "Prompt tokens served from the provider's prompt cache."),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for step in sorted(totals):
+                lines.append(f'{name}{{step="{step}"}} {int(totals[step][key])}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_snapshot(self, path):
+        # 読み込み途中のファイルを見せないよう、一時ファイルに書いてから置き換える
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """前回のスナップショット以降の記録を、すぐにPrometheusのスナップショットへ書き出す"""
+        if not self.prometheus_path:
+            return
+        with self._snapshot_lock:
+            if not self._snapshot_pending.is_set():
+                return
+            # 書き出し中に記録された分は、次の書き出しに回す
+            self._snapshot_pending.clear()
+            try:
+                self.write_prometheus_snapshot(self.prometheus_path)
+            except OSError:
+                logger.exception("Prometheusのスナップショットを書き出せませんでした: %s", self.prometheus_path)
+
+    def _snapshot_loop(self):
+        while True:
+            self._snapshot_pending.wait()
+            self.flush()
+            time.sleep(self.prometheus_interval)
+
+    @contextmanager
+    def track(self, step, **fields):
+        """ブロックの処理時間を計測して記録する。例外が発生した場合はエラーとして記録する
+
+        Streamlitの再実行による中断（BaseException）も、例外名をエラーとして記録する。
+        """
+        span = Span(step, **fields)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            self.record(step, (time.perf_counter() - span.started) * 1000, ttft_ms=span.ttft_ms, **span.fields)
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # 最近傍順位法
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_metrics():
+    """プロセス共有の計測レコーダーを返す（出力先は環境変数で変更できる）"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(
+                path=os.getenv("METRICS_PATH", DEFAULT_METRICS_PATH),
+                prometheus_path=os.getenv("METRICS_PROMETHEUS_PATH", DEFAULT_PROMETHEUS_PATH),
+                prometheus_interval=float(os.getenv("METRICS_PROMETHEUS_INTERVAL", DEFAULT_PROMETHEUS_INTERVAL)),
+            )
+    return _recorder
+
+
+def track(step, **fields):
+    return get_metrics().track(step, **fields)
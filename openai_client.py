@@ -0,0 +1,241 @@
+"""OpenAIクライアントの共有レイヤー
+
+サーバープロセスごとにクライアントを1つだけ生成し、HTTPコネクションプール
+（keep-alive接続）を全セッション・全リクエストで再利用する。
+Chat Completionsの呼び出しは chat_completion() / async_chat_completion() を通し、
+プロセス共有の流量制限・再試行・サーキットブレーカーを適用する。
+設定値は環境変数（.env）から読み込む。
+"""
+import asyncio
+import email.utils
+import os
+import threading
+import time
+
+import openai
+
+from resilience import CircuitBreaker, RateLimiter, backoff_delay
+
+try:
+    import httpx
+except ImportError:
+    # openai 3系以降は httpx2 を使用している
+    import httpx2 as httpx
+
+# プロセス全体で共有するクライアント（APIキーごと）
+_clients = {}
+_clients_lock = threading.Lock()
+
+# プロセス全体で共有する流量制限とサーキットブレーカー
+_rate_limiter = None
+_circuit_breaker = None
+_guards_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def connection_limits():
+    # コネクションプールの上限とkeep-aliveの保持時間
+    return httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def request_timeout():
+    # 読み取りタイムアウトは長文生成に合わせて長めに、接続は短めに設定
+    return httpx.Timeout(
+        _env_float("OPENAI_TIMEOUT", 120.0),
+        connect=_env_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+    )
+
+
+# 再試行は chat_completion() 側で行うため、クライアント自体の再試行は既定で無効にしている
+def get_client(api_key=None):
+    """プロセス共有のOpenAIクライアントを返す（初回呼び出し時のみ生成）"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = openai.OpenAI(
+                api_key=api_key,
+                timeout=request_timeout(),
+                max_retries=_env_int("OPENAI_MAX_RETRIES", 0),
+                http_client=openai.DefaultHttpxClient(
+                    limits=connection_limits(),
+                    timeout=request_timeout(),
+                ),
+            )
+            _clients[api_key] = client
+    return client
+
+
+def create_async_client(api_key=None):
+    """バッチ処理用の非同期クライアントを生成する
+
+    非同期クライアントの接続はイベントループに紐づくため、プロセス共有にはせず
+    イベントループ（asyncio.run）ごとに1つ生成して使い回す。
+    """
+    return openai.AsyncOpenAI(
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        timeout=request_timeout(),
+        max_retries=_env_int("OPENAI_MAX_RETRIES", 0),
+        http_client=openai.DefaultAsyncHttpxClient(
+            limits=connection_limits(),
+            timeout=request_timeout(),
+        ),
+    )
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    with _guards_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                requests_per_minute=_env_int("OPENAI_RPM_LIMIT", 500),
+                tokens_per_minute=_env_int("OPENAI_TPM_LIMIT", 200000),
+            )
+    return _rate_limiter
+
+
+def get_circuit_breaker():
+    global _circuit_breaker
+    with _guards_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker(
+                failure_threshold=_env_int("OPENAI_CIRCUIT_FAILURE_THRESHOLD", 5),
+                reset_timeout=_env_float("OPENAI_CIRCUIT_RESET_SECONDS", 30.0),
+            )
+    return _circuit_breaker
+
+
+def estimate_request_tokens(request):
+    # 流量制限用の概算（日本語はおおむね1文字1トークン前後として、入力文字数＋出力上限で見積もる）
+    prompt_chars = sum(len(message.get("content") or "") for message in request.get("messages", []))
+    return prompt_chars + request.get("max_tokens", 0)
+
+
+def _is_retryable(error):
+    if isinstance(error, openai.RateLimitError):
+        # 利用枠の超過は待っても回復しない
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error):
+    """エラー応答の Retry-After（秒）を返す。指定がなければ None"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            # 形式が不正な場合は指定なしとみなす（元のエラーを隠さないように）
+            return None
+        if retry_at is not None:
+            return max(retry_at.timestamp() - time.time(), 0)
+    return None
+
+
+def _retry_settings():
+    return (
+        _env_int("OPENAI_RETRY_MAX_ATTEMPTS", 4),
+        _env_float("OPENAI_RETRY_BASE_DELAY", 1.0),
+        _env_float("OPENAI_RETRY_MAX_DELAY", 30.0),
+    )
+
+
+def chat_completion(client, **request):
+    """流量制限・再試行・サーキットブレーカーを適用して Chat Completions を呼び出す
+
+    429と5xx、接続エラーはジッター付き指数バックオフで再試行する（Retry-Afterを尊重）。
+    stream=True の場合は、ストリームの確立までが再試行の対象になる。
+    """
+    breaker = get_circuit_breaker()
+    limiter = get_rate_limiter()
+    max_attempts, base_delay, max_delay = _retry_settings()
+
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        # 半開状態の試行を解決しないまま終わらないよう、どの終わり方でも結果を記録する
+        record = breaker.record_aborted
+        try:
+            limiter.acquire(estimate_request_tokens(request))
+            response = client.chat.completions.create(**request)
+        except Exception as e:
+            if not _is_retryable(e):
+                if isinstance(e, openai.APIError):
+                    # 400/401 などはAPIが応答できているので、遮断の判断では成功として扱う
+                    record = breaker.record_success
+                raise
+            record = breaker.record_failure
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, _retry_after(e))
+        else:
+            record = breaker.record_success
+            return response
+        finally:
+            record()
+        time.sleep(delay)
+
+
+async def async_chat_completion(client, **request):
+    """chat_completion() の非同期版（バッチ処理用）"""
+    breaker = get_circuit_breaker()
+    limiter = get_rate_limiter()
+    max_attempts, base_delay, max_delay = _retry_settings()
+
+    for attempt in range(max_attempts):
+        breaker.before_call()
+        # 取り消し（CancelledError）で終わった場合も半開状態の試行を解決する
+        record = breaker.record_aborted
+        try:
+            wait = limiter.reserve(estimate_request_tokens(request))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            response = await client.chat.completions.create(**request)
+        except Exception as e:
+            if not _is_retryable(e):
+                if isinstance(e, openai.APIError):
+                    record = breaker.record_success
+                raise
+            record = breaker.record_failure
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, _retry_after(e))
+        else:
+            record = breaker.record_success
+            return response
+        finally:
+            record()
+        await asyncio.sleep(delay)
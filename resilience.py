@@ -0,0 +1,134 @@
+"""API呼び出しの流量制御と障害対策
+
+- TokenBucket: リクエスト数・トークン数の流量制限（プロセス内の全セッションで共有）
+- CircuitBreaker: 失敗が続いたときに一定時間リクエストを止める
+- backoff_delay: ジッター付き指数バックオフの待ち時間
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """一定の速度で補充されるトークンバケット
+
+    reserve() は必要量を先取りし、呼び出し側が待つべき秒数を返す。
+    待ち方（time.sleep / asyncio.sleep）は呼び出し側が選べる。
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        # バケットの容量を超える要求は容量まで切り詰める（永久に待たないように）
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.refill_per_second
+
+    def acquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    @property
+    def available(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+
+
+class RateLimiter:
+    """1分あたりのリクエスト数（RPM）とトークン数（TPM）の両方を制限する"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    def reserve(self, estimated_tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def acquire(self, estimated_tokens):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(
+            f"APIエラーが続いているため、一時的にリクエストを停止しています（約{retry_in:.0f}秒後に再開します）"
+        )
+
+
+class CircuitBreaker:
+    """連続した失敗が閾値に達すると一定時間リクエストを遮断する
+
+    遮断時間が過ぎると1件だけ試行を許可し（半開状態）、成功すれば通常状態に戻る。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(max(self.reset_timeout - elapsed, 0))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_aborted(self):
+        """成否が分からないまま試行が終わったとき（取り消し・例外など）に呼ぶ
+
+        半開状態の試行だった場合は遮断状態に戻し、次の呼び出しで改めて試行させる。
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0, retry_after=None):
+    """attempt 回目（0始まり）の再試行までの待ち時間（フルジッター）
+
+    サーバーから Retry-After が返されている場合はそれより短くしない。
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
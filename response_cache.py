@@ -0,0 +1,237 @@
+"""APIレスポンスのディスクキャッシュ
+
+(model, messages, temperature, max_tokens, その他の指定) のハッシュをキーに、生成結果のテキストを
+SQLiteファイルへ保存する。再起動後も有効で、TTLと件数上限（LRU削除）を持つ。
+
+その手前に、全セッションで共有するメモリ上のキャッシュ（SharedResultCache）を置く。
+同じリクエストが同時に来た場合は最初の1件だけを実行し、他のセッションはその結果を待って受け取る。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "responses.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_SHARED_MAX_ENTRIES = 256
+DEFAULT_SHARED_WAIT_SECONDS = 120
+
+HIT = "hit"
+COALESCED = "coalesced"
+MISS = "miss"
+
+
+def make_cache_key(model, messages, temperature, max_tokens, **options):
+    # options は response_format など、応答の内容に影響するその他の指定
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **options,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 接続は1つを共有し、ロックで直列化する（Streamlitは複数スレッドから呼び出すため）
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn as conn:
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # 期限切れを削除し、上限を超えた分は最終アクセスが古い順に削除する
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock, self._conn as conn:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class _Flight:
+    # 実行中のリクエスト（同じキーで待っているセッションに結果を渡す）
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SharedResultCache:
+    """全セッションで共有する件数上限付きのメモリキャッシュと、同一リクエストの集約"""
+
+    def __init__(self, max_entries=DEFAULT_SHARED_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 wait_seconds=DEFAULT_SHARED_WAIT_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def _get_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if now - created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """key の結果を返す。戻り値は (結果, HIT / COALESCED / MISS)
+
+        キャッシュになければ compute() を実行する。compute は (結果, キャッシュしてよいか) を返す。
+        同じキーの compute が実行中であれば、新たに実行せずにその結果を待つ
+        （実行中の compute が例外で終わった場合は、待っていた側にも同じ例外を送出する）。
+        """
+        with self._lock:
+            value = self._get_entry(key, time.time())
+            if value is not None:
+                self.hits += 1
+                return value, HIT
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(self.wait_seconds):
+                raise TimeoutError("同じリクエストの完了を待てませんでした")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, COALESCED
+
+        try:
+            value, cacheable = compute()
+            flight.value = value
+            if cacheable:
+                self.set(key, value)
+            return value, MISS
+        except BaseException as e:
+            # Streamlitの再実行による中断なども、待っている側にはエラーとして伝える
+            flight.error = e if isinstance(e, Exception) else RuntimeError("同じリクエストが中断されました")
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._flights),
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_shared = None
+
+
+def get_response_cache():
+    """プロセス共有のレスポンスキャッシュを返す（設定は環境変数から読み込む）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                path=os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            )
+    return _cache
+
+
+def get_shared_result_cache():
+    """プロセス共有のメモリキャッシュを返す（件数上限は環境変数 SHARED_CACHE_MAX_ENTRIES で変更できる）"""
+    global _shared
+    with _cache_lock:
+        if _shared is None:
+            _shared = SharedResultCache(
+                max_entries=int(os.getenv("SHARED_CACHE_MAX_ENTRIES", DEFAULT_SHARED_MAX_ENTRIES)),
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            )
+    return _shared
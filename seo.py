@@ -0,0 +1,288 @@
+"""SEO評価のための記事解析
+
+複数キーワードの出現回数を、Aho-Corasick法のオートマトンで本文を1回走査するだけで数える。
+評価はStreamlitに依存しない純粋な関数としてまとめ、結果をキャッシュできるようにしている。
+"""
+import re
+from collections import deque
+
+H2_PATTERN = re.compile(r'^## ', re.MULTILINE)
+H3_PATTERN = re.compile(r'^### ', re.MULTILINE)
+
+
+def _fold(ch):
+    # 大文字小文字を区別しない比較用に1文字ずつ小文字化する
+    # （小文字化で文字数が変わる特殊な文字はそのまま扱い、位置がずれないようにする）
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+class KeywordMatcher:
+    """複数キーワードを一度に検索するAho-Corasickオートマトン"""
+
+    def __init__(self, keywords):
+        # 重複を除いたキーワード（入力順を保持）
+        self.keywords = list(dict.fromkeys(kw for kw in keywords if kw))
+
+        # 小文字化すると同じになるキーワードは1つのパターンにまとめる
+        self._patterns = []
+        self._pattern_keywords = []
+        pattern_ids = {}
+        for keyword in self.keywords:
+            pattern = "".join(_fold(ch) for ch in keyword)
+            if pattern not in pattern_ids:
+                pattern_ids[pattern] = len(self._patterns)
+                self._patterns.append(pattern)
+                self._pattern_keywords.append([])
+            self._pattern_keywords[pattern_ids[pattern]].append(keyword)
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._build()
+
+    def _build(self):
+        for pattern_id, pattern in enumerate(self._patterns):
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][ch] = next_state
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # 幅優先で失敗遷移を求め、出力を失敗先から引き継ぐ
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def step(self, state, ch):
+        """状態 state で文字 ch を読んだ後の状態を返す"""
+        ch = _fold(ch)
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        return goto[state].get(ch, 0)
+
+    def iter_matches(self, text):
+        """(開始位置, 終了位置, パターン番号) を本文の先頭から順に返す（重なりを含む）"""
+        state = 0
+        patterns = self._patterns
+        output = self._output
+        for position, ch in enumerate(text):
+            state = self.step(state, ch)
+            for pattern_id in output[state]:
+                end = position + 1
+                yield end - len(patterns[pattern_id]), end, pattern_id
+
+    def find_all(self, text):
+        """キーワードごとに重ならない出現位置を (開始, 終了, キーワード) のリストで返す
+
+        同じキーワード同士の重なりは str.count と同じく先に見つかった方を優先する。
+        """
+        last_end = [0] * len(self._patterns)
+        matches = []
+        for start, end, pattern_id in self.iter_matches(text):
+            if start < last_end[pattern_id]:
+                continue
+            last_end[pattern_id] = end
+            for keyword in self._pattern_keywords[pattern_id]:
+                matches.append((start, end, keyword))
+        return matches
+
+    def count(self, text):
+        """キーワードごとの出現回数を返す（大文字小文字は区別しない）"""
+        counts = dict.fromkeys(self.keywords, 0)
+        for _, _, keyword in self.find_all(text):
+            counts[keyword] += 1
+        return counts
+
+
+def highlight_keywords(text, matches):
+    """出現位置をStreamlitのMarkdown記法（背景色）で強調した文字列を返す"""
+    # 異なるキーワードの出現位置が重なる場合は1つの範囲にまとめる
+    spans = []
+    for start, end, _ in sorted(matches):
+        if spans and start < spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(text[position:start])
+        parts.append(f":orange-background[{text[start:end]}]")
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def calculate_seo_score(article_length, keyword_density, h2_count, h3_count, title_length, keyword_kinds):
+    """SEOスコアを計算する（100点満点）"""
+    score = 0
+
+    # 文字数評価（1500-3000文字が理想）30点
+    if 1500 <= article_length <= 3000:
+        score += 30
+    elif 1000 <= article_length < 1500 or 3000 < article_length <= 4000:
+        score += 20
+    else:
+        score += 10
+
+    # キーワード密度評価 25点
+    if 1 <= keyword_density <= 3:
+        score += 25
+    elif 0.5 <= keyword_density < 1 or 3 < keyword_density <= 5:
+        score += 15
+    else:
+        score += 5
+
+    # 見出し構造評価 20点
+    if h2_count >= 3 and h3_count >= 2:
+        score += 20
+    elif h2_count >= 2:
+        score += 15
+    elif h2_count >= 1:
+        score += 10
+    else:
+        score += 5
+
+    # タイトル長評価 15点
+    if 20 <= title_length <= 32:
+        score += 15
+    elif 15 <= title_length < 20 or 32 < title_length <= 40:
+        score += 10
+    else:
+        score += 5
+
+    # キーワード種類評価 10点
+    if keyword_kinds >= 3:
+        score += 10
+    elif keyword_kinds >= 2:
+        score += 7
+    else:
+        score += 3
+
+    return min(score, 100)
+
+
+class IncrementalSeoAnalyzer:
+    """ストリーミングで届く本文を少しずつ受け取り、SEO評価指標を更新し続ける
+
+    feed() の処理時間は受け取った文字数に比例する（それまでの本文を読み直さない）。
+    オートマトンの状態と行頭の文字を持ち越すため、チャンクの境目をまたぐキーワードや
+    見出しも evaluate_article() と同じ結果になる。
+    """
+
+    def __init__(self, title, seo_keywords, additional_keywords=()):
+        self.title = title
+        self.keyword_kinds = len(seo_keywords)
+        self.matcher = KeywordMatcher(list(seo_keywords) + list(additional_keywords))
+        self.article_length = 0
+        self.h2_count = 0
+        self.h3_count = 0
+        self._state = 0
+        self._pattern_counts = [0] * len(self.matcher._patterns)
+        self._last_end = [0] * len(self.matcher._patterns)
+        # 現在の行の先頭（見出しの判定に必要な4文字まで）
+        self._line_head = ""
+
+    def feed(self, chunk):
+        matcher = self.matcher
+        patterns = matcher._patterns
+        output = matcher._output
+        counts = self._pattern_counts
+        last_end = self._last_end
+        state = self._state
+        position = self.article_length
+        line_head = self._line_head
+
+        for ch in chunk:
+            state = matcher.step(state, ch)
+            position += 1
+            # キーワードごとに重ならない出現を数える（KeywordMatcher.find_all と同じ規則）
+            for pattern_id in output[state]:
+                if position - len(patterns[pattern_id]) >= last_end[pattern_id]:
+                    last_end[pattern_id] = position
+                    counts[pattern_id] += 1
+
+            if ch == "\n":
+                line_head = ""
+            elif len(line_head) < 4:
+                line_head += ch
+                if line_head == "## ":
+                    self.h2_count += 1
+                elif line_head == "### ":
+                    self.h3_count += 1
+
+        self._state = state
+        self.article_length = position
+        self._line_head = line_head
+
+    @property
+    def keyword_counts(self):
+        counts = dict.fromkeys(self.matcher.keywords, 0)
+        for pattern_id, count in enumerate(self._pattern_counts):
+            for keyword in self.matcher._pattern_keywords[pattern_id]:
+                counts[keyword] += count
+        return counts
+
+    def evaluate(self):
+        """ここまでに受け取った本文の評価指標を evaluate_article() と同じ形式で返す"""
+        keyword_counts = self.keyword_counts
+        total_keyword_count = sum(keyword_counts.values())
+        keyword_density = (total_keyword_count / self.article_length) * 100 if self.article_length > 0 else 0
+        title_length = len(self.title)
+        return {
+            "article_length": self.article_length,
+            "keyword_counts": keyword_counts,
+            "total_keyword_count": total_keyword_count,
+            "keyword_density": keyword_density,
+            "h2_count": self.h2_count,
+            "h3_count": self.h3_count,
+            "title_length": title_length,
+            "seo_score": calculate_seo_score(
+                self.article_length, keyword_density, self.h2_count, self.h3_count, title_length, self.keyword_kinds
+            ),
+        }
+
+
+def evaluate_article(article_text, title, seo_keywords, additional_keywords=()):
+    """記事のSEO評価指標をまとめて計算する"""
+    article_length = len(article_text)
+
+    # キーワード出現回数（SEOキーワードと追加キーワードを1回の走査で数える）
+    keyword_counts = KeywordMatcher(list(seo_keywords) + list(additional_keywords)).count(article_text)
+    total_keyword_count = sum(keyword_counts.values())
+    keyword_density = (total_keyword_count / article_length) * 100 if article_length > 0 else 0
+
+    # 見出し数
+    h2_count = len(H2_PATTERN.findall(article_text))
+    h3_count = len(H3_PATTERN.findall(article_text))
+
+    title_length = len(title)
+
+    return {
+        "article_length": article_length,
+        "keyword_counts": keyword_counts,
+        "total_keyword_count": total_keyword_count,
+        "keyword_density": keyword_density,
+        "h2_count": h2_count,
+        "h3_count": h3_count,
+        "title_length": title_length,
+        "seo_score": calculate_seo_score(
+            article_length, keyword_density, h2_count, h3_count, title_length, len(seo_keywords)
+        ),
+    }
@@ -0,0 +1,152 @@
+"""SEO評価タブのグラフ（Plotly）"""
+# plotly は numpy を sys.modules から直接参照するため、先に読み込みを完了させておく
+# （類似記事の索引がジョブのスレッドで numpy を読み込んでいる途中だと、初期化中のモジュールが見えてしまう）
+import numpy  # noqa: F401
+import plotly.graph_objects as go
+
+
+def build_score_gauge(seo_score):
+    # SEO総合スコア（ゲージチャート）
+    fig_score = go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = seo_score,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "SEO総合スコア", 'font': {'size': 20}},
+        delta = {'reference': 80, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
+        gauge = {
+            'axis': {'range': [None, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
+            'bar': {'color': "darkblue"},
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "gray",
+            'steps': [
+                {'range': [0, 50], 'color': "#ffcccc"},
+                {'range': [50, 80], 'color': "#ffffcc"},
+                {'range': [80, 100], 'color': "#ccffcc"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 90
+            }
+        }
+    ))
+    fig_score.update_layout(
+        height=350,
+        margin=dict(l=20, r=20, t=40, b=20),
+        font={'color': "darkblue", 'family': "Arial"}
+    )
+    return fig_score
+
+
+def build_keyword_chart(keyword_counts):
+    # キーワード出現回数（棒グラフ）
+    keywords = list(keyword_counts.keys())
+    counts = list(keyword_counts.values())
+
+    fig_keywords = go.Figure(data=[
+        go.Bar(
+            x=keywords,
+            y=counts,
+            text=counts,
+            textposition='auto',
+            marker=dict(
+                color=counts,
+                colorscale='Blues',
+                line=dict(color='rgba(50,50,50,0.5)', width=1)
+            ),
+            hovertemplate='<b>%{x}</b><br>出現回数: %{y}回<extra></extra>'
+        )
+    ])
+
+    fig_keywords.update_layout(
+        title={
+            'text': "SEOキーワード出現回数",
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 18}
+        },
+        xaxis_title="キーワード",
+        yaxis_title="出現回数",
+        height=350,
+        margin=dict(l=20, r=20, t=60, b=80),
+        font={'family': "Arial"}
+    )
+
+    fig_keywords.update_xaxes(tickangle=45)
+    return fig_keywords
+
+
+# ===============================
+# 一括SEOレポート
+# ===============================
+
+def build_score_distribution(report):
+    # SEOスコアの分布（生成モード別に積み上げたヒストグラム）
+    fig = go.Figure()
+    for mode, scores in report.groupby("generation_mode")["seo_score"]:
+        fig.add_trace(go.Histogram(
+            x=scores,
+            name=mode,
+            xbins=dict(start=0, end=105, size=5),
+            hovertemplate='スコア %{x}点: %{y}件<extra>' + mode + '</extra>'
+        ))
+    fig.add_vline(x=80, line_dash="dash", line_color="green", annotation_text="目標 80点")
+    fig.update_layout(
+        title={'text': "SEOスコアの分布", 'x': 0.5, 'xanchor': 'center', 'font': {'size': 18}},
+        barmode="stack",
+        xaxis_title="SEOスコア",
+        yaxis_title="記事数",
+        height=380,
+        margin=dict(l=20, r=20, t=60, b=40),
+        font={'family': "Arial"}
+    )
+    return fig
+
+
+def build_density_outliers(report):
+    # 文字数とキーワード密度の散布図（四分位範囲から外れた記事を強調）
+    fig = go.Figure()
+    for outlier, name, color in [(False, "通常", "#4c78a8"), (True, "外れ値", "#e45756")]:
+        rows = report[report["density_outlier"] == outlier]
+        fig.add_trace(go.Scattergl(
+            x=rows["article_length"],
+            y=rows["keyword_density"],
+            mode="markers",
+            name=name,
+            marker=dict(color=color, size=7, opacity=0.7),
+            text=rows["title"],
+            hovertemplate='<b>%{text}</b><br>文字数: %{x:,}<br>密度: %{y:.2f}%<extra></extra>'
+        ))
+    fig.add_hrect(y0=1, y1=3, fillcolor="green", opacity=0.08, line_width=0, annotation_text="理想 1-3%")
+    fig.update_layout(
+        title={'text': "キーワード密度の外れ値", 'x': 0.5, 'xanchor': 'center', 'font': {'size': 18}},
+        xaxis_title="文字数",
+        yaxis_title="キーワード密度（%）",
+        height=380,
+        margin=dict(l=20, r=20, t=60, b=40),
+        font={'family': "Arial"}
+    )
+    return fig
+
+
+def build_score_by_keyword(report, limit=15):
+    # 記事数の多いメインキーワードごとのSEOスコア（箱ひげ図）
+    top_keywords = report["keyword"].value_counts().index[:limit]
+    fig = go.Figure()
+    for keyword in top_keywords:
+        fig.add_trace(go.Box(y=report.loc[report["keyword"] == keyword, "seo_score"], name=keyword, boxpoints="outliers"))
+    fig.update_layout(
+        title={'text': "メインキーワード別のSEOスコア", 'x': 0.5, 'xanchor': 'center', 'font': {'size': 18}},
+        yaxis_title="SEOスコア",
+        showlegend=False,
+        height=380,
+        margin=dict(l=20, r=20, t=60, b=80),
+        font={'family': "Arial"}
+    )
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def build_report_figures(report):
+    return [build_score_distribution(report), build_density_outliers(report), build_score_by_keyword(report)]
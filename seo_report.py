@@ -0,0 +1,224 @@
+"""多数の記事のSEO評価をまとめて計算するレポート（pandas）
+
+記事ストア・batch.py の出力JSONL・export.py のZIPから記事を DataFrame に読み込み、
+evaluate_article() と同じ指標（文字数・キーワード密度・見出し数・タイトル文字数・SEOスコア）を
+記事ごとのループではなく列単位の文字列処理で計算する。キーワードの出現回数は、記事ごとではなく
+キーワードの種類ごとに、そのキーワードを持つ記事の列をまとめて数える。
+
+使い方:
+    python seo_report.py -o seo_report.csv --html seo_report.html
+    python seo_report.py --input articles.jsonl -o seo_report.csv
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from article_store import get_article_store
+from export import read_jsonl_records
+from seo import _fold
+
+COLUMNS = ["id", "keyword", "title", "seo_keywords", "additional_keywords", "article", "generation_mode", "created_at"]
+
+# 小文字化で文字数が変わる文字（Unicodeでは "İ" のみ。_fold() はそのまま残す）と、
+# 小文字化の間だけ置き換えておく私用領域の文字
+_MULTI_CHAR_LOWER = "\u0130"
+_PLACEHOLDER = "\ue000"
+
+
+# ===============================
+# 読み込み
+# ===============================
+
+def _record_row(record):
+    settings = record.get("settings") or {}
+    return {
+        "id": record.get("id"),
+        "keyword": record.get("keyword", ""),
+        "title": record.get("title", ""),
+        "seo_keywords": list(record.get("seo_keywords") or []),
+        "additional_keywords": list(record.get("additional_keywords") or []),
+        "article": record.get("article") or "",
+        "generation_mode": record.get("generation_mode") or settings.get("generation_mode") or "不明",
+        "created_at": record.get("created_at"),
+    }
+
+
+def load_articles_frame(records):
+    """記事の辞書（記事ストアやJSONLの1行と同じ形式）を DataFrame にする"""
+    frame = pd.DataFrame.from_records((_record_row(record) for record in records), columns=COLUMNS)
+    frame["created_at"] = pd.to_datetime(frame["created_at"], unit="s", errors="coerce")
+    return frame
+
+
+def read_export_zip_records(path):
+    """export.py で書き出したZIPのMarkdown（front matter 付き）から記事を順に返す"""
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if not name.endswith(".md"):
+                continue
+            text = archive.read(name).decode("utf-8")
+            match = re.match(r"^---\n(.*?)\n---\n\n", text, re.DOTALL)
+            if not match:
+                continue
+            # render_markdown() が末尾に付けた改行は除く
+            record = {"article": text[match.end():].rstrip("\n")}
+            for line in match.group(1).splitlines():
+                key, _, value = line.partition(": ")
+                try:
+                    record[key] = json.loads(value)
+                except ValueError:
+                    record[key] = value
+            yield record
+
+
+# ===============================
+# 評価指標の計算
+# ===============================
+
+def _fold_series(texts):
+    # seo._fold() と同じく、小文字化で文字数が変わる文字はそのまま残して小文字化する
+    return (
+        texts.str.replace(_MULTI_CHAR_LOWER, _PLACEHOLDER, regex=False)
+        .str.lower()
+        .str.replace(_PLACEHOLDER, _MULTI_CHAR_LOWER, regex=False)
+    )
+
+
+def keyword_counts_frame(frame):
+    """(記事の行, キーワード, 出現回数) の DataFrame を返す
+
+    evaluate_article() と同じく、SEOキーワードと追加キーワードの重複を除いた各キーワードについて、
+    大文字小文字を区別せず、重ならない出現を数える（str.count と同じ規則）。
+    """
+    pairs = (frame["seo_keywords"] + frame["additional_keywords"]).map(lambda kws: list(dict.fromkeys(kw for kw in kws if kw)))
+    pairs = pairs.explode().dropna().rename("keyword").reset_index()
+    if pairs.empty:
+        return pd.DataFrame({"index": pd.Series(dtype="int64"), "keyword": pd.Series(dtype="object"), "count": pd.Series(dtype="int64")})
+
+    folded_articles = _fold_series(frame["article"])
+    pairs["pattern"] = pairs["keyword"].map(lambda kw: "".join(_fold(ch) for ch in kw))
+    pairs["count"] = 0
+    # キーワードの種類ごとに、そのキーワードを含む記事の列をまとめて数える
+    for pattern, rows in pairs.groupby("pattern").groups.items():
+        article_rows = pairs.loc[rows, "index"]
+        pairs.loc[rows, "count"] = folded_articles.loc[article_rows].str.count(re.escape(pattern)).to_numpy()
+    return pairs[["index", "keyword", "count"]]
+
+
+def seo_scores(article_length, keyword_density, h2_count, h3_count, title_length, keyword_kinds):
+    """calculate_seo_score() を列単位で計算する"""
+    length_score = np.select(
+        [(article_length >= 1500) & (article_length <= 3000),
+         ((article_length >= 1000) & (article_length < 1500)) | ((article_length > 3000) & (article_length <= 4000))],
+        [30, 20], default=10,
+    )
+    density_score = np.select(
+        [(keyword_density >= 1) & (keyword_density <= 3),
+         ((keyword_density >= 0.5) & (keyword_density < 1)) | ((keyword_density > 3) & (keyword_density <= 5))],
+        [25, 15], default=5,
+    )
+    heading_score = np.select(
+        [(h2_count >= 3) & (h3_count >= 2), h2_count >= 2, h2_count >= 1],
+        [20, 15, 10], default=5,
+    )
+    title_score = np.select(
+        [(title_length >= 20) & (title_length <= 32),
+         ((title_length >= 15) & (title_length < 20)) | ((title_length > 32) & (title_length <= 40))],
+        [15, 10], default=5,
+    )
+    kinds_score = np.select([keyword_kinds >= 3, keyword_kinds >= 2], [10, 7], default=3)
+    return np.minimum(length_score + density_score + heading_score + title_score + kinds_score, 100)
+
+
+def evaluate_frame(frame):
+    """frame に evaluate_article() と同じ評価指標の列を加えた DataFrame を返す"""
+    report = frame.copy()
+    report["article_length"] = report["article"].str.len()
+    # 行頭の判定は、先頭に改行を付けて「改行＋見出し記号」を数える
+    # （pandas の文字列型によっては正規表現エンジンが異なり、(?m)^ の扱いが re と一致しないため）
+    lines = "\n" + report["article"]
+    report["h2_count"] = lines.str.count("\n## ")
+    report["h3_count"] = lines.str.count("\n### ")
+    report["title_length"] = report["title"].str.len()
+    report["keyword_kinds"] = report["seo_keywords"].str.len()
+
+    counts = keyword_counts_frame(report)
+    report["total_keyword_count"] = counts.groupby("index")["count"].sum().reindex(report.index, fill_value=0)
+    report["keyword_density"] = (
+        report["total_keyword_count"] / report["article_length"].where(report["article_length"] > 0) * 100
+    ).fillna(0.0)
+    report["seo_score"] = seo_scores(
+        report["article_length"], report["keyword_density"], report["h2_count"],
+        report["h3_count"], report["title_length"], report["keyword_kinds"],
+    )
+
+    # キーワード密度の外れ値（四分位範囲の1.5倍の外側）と、理想（1-3%）から外れた記事
+    q1, q3 = report["keyword_density"].quantile([0.25, 0.75]) if len(report) else (0.0, 0.0)
+    iqr = q3 - q1
+    report["density_outlier"] = (report["keyword_density"] < q1 - 1.5 * iqr) | (report["keyword_density"] > q3 + 1.5 * iqr)
+    report["density_in_range"] = report["keyword_density"].between(1, 3)
+    return report
+
+
+def summarize(report):
+    """レポート全体の集計値"""
+    if report.empty:
+        return {"articles": 0}
+    return {
+        "articles": len(report),
+        "mean_score": float(report["seo_score"].mean()),
+        "median_score": float(report["seo_score"].median()),
+        "low_score_articles": int((report["seo_score"] < 50).sum()),
+        "density_outliers": int(report["density_outlier"].sum()),
+        "density_in_range_rate": float(report["density_in_range"].mean()),
+    }
+
+
+# ===============================
+# コマンドライン
+# ===============================
+
+REPORT_COLUMNS = [
+    "id", "keyword", "title", "generation_mode", "created_at", "article_length", "keyword_density",
+    "h2_count", "h3_count", "title_length", "keyword_kinds", "seo_score", "density_outlier",
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存済みの記事のSEO評価をまとめて計算します")
+    parser.add_argument("--input", help="batch.py の出力JSONL、または export.py のZIP（省略時は記事履歴のすべての記事）")
+    parser.add_argument("-o", "--output", default="seo_report.csv", help="記事ごとの評価指標を書き出すCSVファイル")
+    parser.add_argument("--html", help="グラフをまとめたHTMLファイル（plotlyが必要）")
+    args = parser.parse_args(argv)
+
+    if not args.input:
+        records = get_article_store().iter_articles()
+    elif args.input.endswith(".zip"):
+        records = read_export_zip_records(args.input)
+    else:
+        records = read_jsonl_records(args.input)
+
+    started = time.perf_counter()
+    report = evaluate_frame(load_articles_frame(records))
+    elapsed = time.perf_counter() - started
+    report[REPORT_COLUMNS].to_csv(args.output, index=False, encoding="utf-8-sig")
+
+    if args.html:
+        from seo_charts import build_report_figures
+        with open(args.html, "w", encoding="utf-8") as f:
+            for i, fig in enumerate(build_report_figures(report)):
+                f.write(fig.to_html(full_html=False, include_plotlyjs="cdn" if i == 0 else False))
+
+    print(json.dumps(summarize(report), ensure_ascii=False, indent=2), file=sys.stderr)
+    print(f"📈 {len(report):,}件の記事を評価しました（{elapsed:.2f}秒） → {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""生成した記事どうしの類似検出（MinHash + LSH）
+
+同じキーワードで何度も生成すると、ほとんど同じ内容の記事ができることがある（SEO上も不利で、費用も二重にかかる）。
+記事を文字n-gram（日本語でも分かち書き不要）の集合として MinHash の署名に変換し、署名を帯（band）に分けた
+LSH のバケットで候補を絞り込むため、保存済みの記事が増えても全件と比較せずに似た記事を見つけられる。
+類似度は署名の一致率（n-gram 集合の Jaccard 係数の推定値）で、環境変数 DUPLICATE_THRESHOLD 以上を重複とみなす。
+索引は記事ストアの記事だけを持ち、保存された記事は get_duplicate_index() の呼び出し時に取り込まれる。
+"""
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+from article_store import get_article_store
+
+DEFAULT_NGRAM = 5
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+DEFAULT_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# 見出しや箇条書きの記号・空白は比較に使わない
+_NORMALIZE_PATTERN = re.compile(r"[\s#*\-・、。「」（）()]+")
+
+
+def shingles(text, n=DEFAULT_NGRAM):
+    """記号と空白を除いた text の文字 n-gram の集合"""
+    text = _NORMALIZE_PATTERN.sub("", text).lower()
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, seed=1):
+        # numpy は重いため、最初の画面の表示では読み込まず、索引を作るときに初めて読み込む
+        import numpy as np
+        rng = np.random.default_rng(seed)
+        # (a * h + b) mod p が uint64 であふれないよう、a は31ビット、h は32ビット（crc32）に収める
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text, n=DEFAULT_NGRAM):
+        import numpy as np
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text, n)), dtype=np.uint64
+        )
+        if not len(hashes):
+            return np.full(len(self.a), _MERSENNE_PRIME, dtype=np.uint64)
+        return ((np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+
+def article_hash(article):
+    return hashlib.sha1(article.encode("utf-8")).hexdigest()
+
+
+class DuplicateIndex:
+    """記事ストアの記事の MinHash 署名と LSH バケットを保持する索引（記事のIDで記事を区別する）
+
+    本文が完全に同じ記事も別の記事として持ち、類似度 1.0 の重複として見つける。
+    """
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, threshold=DEFAULT_THRESHOLD):
+        if num_perm % bands:
+            raise ValueError("num_perm は bands で割り切れる必要があります")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(set)
+        self._entries = {}
+        # 本文のハッシュ → その本文を持つ最も新しい記事のID
+        self._latest_ids = {}
+        self._synced_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, article_id, article, **info):
+        """記事ストアの記事を索引に加える（info はタイトルなど、検索結果に含める値）"""
+        signature = self.hasher.signature(article)
+        with self._lock:
+            if article_id in self._entries:
+                return
+            self._entries[article_id] = (signature, dict(info, id=article_id))
+            for band_key in self._band_keys(signature):
+                self._buckets[band_key].add(article_id)
+            key = article_hash(article)
+            self._latest_ids[key] = max(self._latest_ids.get(key, article_id), article_id)
+
+    def latest_id(self, article):
+        """本文が article と完全に同じ記事のうち、最も新しい記事のID（なければ None）"""
+        with self._lock:
+            return self._latest_ids.get(article_hash(article))
+
+    def find(self, article, limit=5, exclude_id=None):
+        """article と似た記事を類似度の高い順に返す
+
+        表示中の記事どうしを比べる場合は、exclude_id にその記事のIDを渡して自分自身を除く。
+        """
+        import numpy as np
+        signature = self.hasher.signature(article)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates |= self._buckets.get(band_key, set())
+            candidates.discard(exclude_id)
+            matches = []
+            for candidate in candidates:
+                other, info = self._entries[candidate]
+                similarity = float(np.mean(signature == other))
+                if similarity >= self.threshold:
+                    matches.append(dict(info, similarity=similarity))
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        return matches[:limit]
+
+    def sync(self, store):
+        """前回以降に記事ストアへ保存された記事を索引に加える"""
+        for record in store.iter_articles(after_id=self._synced_id):
+            self.add(record["id"], record["article"], keyword=record["keyword"], title=record["title"])
+            with self._lock:
+                self._synced_id = max(self._synced_id, record["id"])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index():
+    """プロセス共有の類似記事の索引を返す（呼び出すたびに記事ストアの新しい記事を取り込む）"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex(threshold=float(os.getenv("DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD)))
+        _index.sync(get_article_store())
+    return _index